@@ -2,6 +2,8 @@
 ASGI config for SnapBook project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it (e.g. ``uvicorn SnapBook.asgi:application``) for the long-lived
+activity stream at /api/events/; WSGI workers would be tied up by it.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -0,0 +1,16 @@
+import time
+
+from django.db.backends.postgresql import base
+
+from SnapBook import metrics
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend that records how long opening a connection takes."""
+
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        metrics.observe(f'db.connect.{self.alias}', time.perf_counter() - started)
+        metrics.increment(f'db.connections_opened.{self.alias}')
+        return connection
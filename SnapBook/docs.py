@@ -0,0 +1,101 @@
+"""
+API documentation views.
+
+Generating the OpenAPI schema introspects every view, so it is built ahead
+of time by `manage.py build_openapi_schema` and served as a static file with
+an ETag and a long max-age. With OPENAPI_SCHEMA_LIVE the schema is generated
+on every request instead, which is handy while changing views.
+drf-yasg itself is only imported on first use.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from rest_framework import permissions
+
+SCHEMA_FORMATS = {
+    'json': 'application/json',
+    'yaml': 'application/yaml',
+}
+
+
+def api_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="SnapBook - Social Media API",
+        default_version='v1',
+        description="API documentation for SnapBook Social-Media platform",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="contact@snapbook.com"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_schema_view():
+    from drf_yasg.views import get_schema_view
+
+    return get_schema_view(
+        api_info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+
+def generate_schema(fmt):
+    """Render the full schema as bytes in `fmt` ('json' or 'yaml')."""
+    from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    schema = OpenAPISchemaGenerator(api_info()).get_schema(request=None, public=True)
+    codec = OpenAPICodecJson if fmt == 'json' else OpenAPICodecYaml
+    return codec(validators=[]).encode(schema)
+
+
+def schema_path(fmt):
+    return settings.OPENAPI_SCHEMA_DIR / f'openapi.{fmt}'
+
+
+@lru_cache(maxsize=None)
+def load_schema(fmt):
+    """The built artifact and its ETag, generated once per process if missing."""
+    path = schema_path(fmt)
+    content = path.read_bytes() if path.exists() else generate_schema(fmt)
+    return content, hashlib.sha256(content).hexdigest()
+
+
+@condition(etag_func=lambda request, fmt: load_schema(fmt)[1])
+def static_schema(request, fmt):
+    content, _ = load_schema(fmt)
+    response = HttpResponse(content, content_type=SCHEMA_FORMATS[fmt])
+    patch_cache_control(response, public=True, max_age=settings.OPENAPI_SCHEMA_CACHE_SECONDS)
+    return response
+
+
+@lru_cache(maxsize=None)
+def get_live_schema_view():
+    return get_schema_view().without_ui(cache_timeout=0)
+
+
+@lru_cache(maxsize=None)
+def get_docs_view(renderer):
+    return get_schema_view().with_ui(renderer, cache_timeout=0)
+
+
+def schema_view(fmt):
+    def view(request, *args, **kwargs):
+        if settings.OPENAPI_SCHEMA_LIVE:
+            return get_live_schema_view()(request, format=f'.{fmt}')
+        return static_schema(request, fmt)
+    return view
+
+
+def docs_view(renderer):
+    # outside live mode the UI loads the schema from static_schema (SPEC_URL)
+    def view(request, *args, **kwargs):
+        return get_docs_view(renderer)(request, *args, **kwargs)
+    return view
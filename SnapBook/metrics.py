@@ -0,0 +1,35 @@
+"""
+Minimal in-process metrics: counters and timing summaries, readable at
+/api/admin/metrics/. Values are per worker process and reset on restart.
+"""
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, seconds):
+    with _lock:
+        timing = _timings.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+        timing['count'] += 1
+        timing['total'] += seconds
+        timing['max'] = max(timing['max'], seconds)
+
+
+def snapshot():
+    with _lock:
+        timings = {
+            name: {
+                'count': t['count'],
+                'avg_ms': round(t['total'] / t['count'] * 1000, 3),
+                'max_ms': round(t['max'] * 1000, 3),
+            }
+            for name, t in _timings.items()
+        }
+        return {'counters': dict(_counters), 'timings': timings}
@@ -0,0 +1,37 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Admin changelist paginator that reads the planner's row estimate from
+    pg_class.reltuples for unfiltered listings of very large tables instead
+    of running COUNT(*) over the whole table.
+    """
+
+    # below this many rows an exact count is cheap enough
+    approximate_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = self.estimated_rows()
+            if estimate is not None and estimate > self.approximate_threshold:
+                return estimate
+        return super().count
+
+    def estimated_rows(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
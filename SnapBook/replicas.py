@@ -0,0 +1,116 @@
+"""
+Read-replica routing.
+
+ReplicaMiddleware decides per request whether reads may go to a replica:
+the method must be safe, the view must opt in with `read_replica = True`,
+the client must not have written recently (read-your-writes pinning) and a
+replica must be reachable. ReplicaRouter then sends reads to the chosen
+alias and every write to the primary. A replica that fails mid-request is
+marked down and the view is run again on the primary.
+"""
+import hashlib
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_alias = ContextVar('read_alias', default=None)
+
+# alias -> monotonic time before which the replica is not retried
+_down_until = {}
+
+
+def mark_replica_down(alias):
+    _down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def healthy_replica():
+    """Pick a reachable replica, or None to stay on the primary."""
+    now = time.monotonic()
+    candidates = [
+        alias for alias in settings.REPLICA_DATABASES
+        if _down_until.get(alias, 0) <= now
+    ]
+    random.shuffle(candidates)
+
+    for alias in candidates:
+        try:
+            connections[alias].ensure_connection()
+        except OperationalError:
+            mark_replica_down(alias)
+            continue
+        return alias
+    return None
+
+
+def _pin_key(request):
+    auth = request.META.get('HTTP_AUTHORIZATION')
+    if not auth:
+        return None
+    return 'db-pin:' + hashlib.sha256(auth.encode()).hexdigest()
+
+
+class ReplicaMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.set(None)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            key = _pin_key(request)
+            if key:
+                cache.set(key, 1, settings.REPLICA_PIN_SECONDS)
+
+        return response
+
+    def process_exception(self, request, exception):
+        alias = _read_alias.get()
+        if not alias or not isinstance(exception, OperationalError):
+            return None
+
+        mark_replica_down(alias)
+        _read_alias.set(None)
+        view_func, view_args, view_kwargs = request.replica_view
+        return view_func(request, *view_args, **view_kwargs)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.REPLICA_DATABASES or request.method not in SAFE_METHODS:
+            return None
+        if not getattr(getattr(view_func, 'cls', None), 'read_replica', False):
+            return None
+
+        key = _pin_key(request)
+        if key and cache.get(key):
+            return None
+
+        alias = healthy_replica()
+        if alias:
+            # safe methods only, so the view can be run again on the primary
+            request.replica_view = (view_func, view_args, view_kwargs)
+        _read_alias.set(alias)
+        return None
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -12,10 +12,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
+from importlib.util import find_spec
 from decouple import config
-import cloudinary
-import cloudinary.uploader
-from cloudinary.utils import cloudinary_url
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,12 +45,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
+    'django_filters',
     "corsheaders",
     'drf_yasg',
     'rest_framework_simplejwt',
     'djoser',
-    'debug_toolbar',
     "cloudinary",
     "cloudinary_storage",
     'api',
@@ -65,7 +64,6 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', 
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.common.CommonMiddleware',
@@ -73,8 +71,19 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'SnapBook.replicas.ReplicaMiddleware',
 ]
 
+# The toolbar (app, middleware and urls) is only loaded when enabled
+ENABLE_DEBUG_TOOLBAR = config('ENABLE_DEBUG_TOOLBAR', default=DEBUG, cast=bool)
+
+if ENABLE_DEBUG_TOOLBAR:
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('djoser') + 1, 'debug_toolbar')
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('whitenoise.middleware.WhiteNoiseMiddleware') + 1,
+        'debug_toolbar.middleware.DebugToolbarMiddleware'
+    )
+
 ROOT_URLCONF = 'SnapBook.urls'
 
 TEMPLATES = [
@@ -105,17 +114,72 @@ WSGI_APPLICATION = 'SnapBook.wsgi.app'
 #     }
 # }
 
+# "serverless" on Vercel (which sets VERCEL=1), "server" for long-lived processes
+DEPLOYMENT_PROFILE = config(
+    'DEPLOYMENT_PROFILE',
+    default='serverless' if config('VERCEL', default='') else 'server'
+)
+
+# Django's native pool needs psycopg 3 with psycopg-pool. It only pays off in
+# long-lived processes; serverless instances keep one persistent connection.
+DB_POOL = config(
+    'DB_POOL',
+    default=DEPLOYMENT_PROFILE == 'server' and find_spec('psycopg_pool') is not None,
+    cast=bool
+)
+# Set when connecting through PgBouncer in transaction mode
+DB_PGBOUNCER = config('DB_PGBOUNCER', default=False, cast=bool)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # django.db.backends.postgresql plus connection setup timing
+        'ENGINE': 'SnapBook.db',
         'NAME': config('DB_NAME'),
         'USER': config('DB_USER'),
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT'),
+        # pooled connections must not also be persistent
+        'CONN_MAX_AGE': 0 if DB_POOL else config(
+            'DB_CONN_MAX_AGE',
+            default=60 if DEPLOYMENT_PROFILE == 'serverless' else 600,
+            cast=int
+        ),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+        'OPTIONS': {
+            'connect_timeout': 5,
+        },
     }
 }
 
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'timeout': 10,
+    }
+
+# Read replicas (SnapBook/replicas.py): comma separated hosts sharing the
+# primary's credentials. Views opt in with `read_replica = True`.
+REPLICA_DATABASES = []
+for index, host in enumerate(h for h in config('DB_REPLICA_HOSTS', default='').split(',') if h):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['SnapBook.replicas.ReplicaRouter']
+
+# Reads stay on the primary this long after a client writes (read-your-writes).
+# Tracked in the default cache, so share it (REDIS_URL) across workers.
+REPLICA_PIN_SECONDS = 5
+# An unreachable replica is skipped for this long
+REPLICA_RETRY_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -136,6 +200,24 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+PASSWORD_HASHERS = [
+    # memory-hard; PBKDF2 hashes are upgraded on the next successful login
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+AUTHENTICATION_BACKENDS = [
+    'users.backends.PooledModelBackend',
+]
+
+# Password checks run in a separate process pool (users/hashing.py).
+# 0 workers verifies inline.
+PASSWORD_CHECK_WORKERS = config('PASSWORD_CHECK_WORKERS', default=2, cast=int)
+PASSWORD_CHECK_MAX_PENDING = config('PASSWORD_CHECK_MAX_PENDING', default=8, cast=int)
+PASSWORD_CHECK_WAIT = 2
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
 
@@ -179,11 +261,40 @@ MEDIA_ROOT = BASE_DIR / 'media'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # token buckets per user (or IP) and scope, see SnapBook/throttling.py
+    'DEFAULT_THROTTLE_CLASSES': [
+        'SnapBook.throttling.TokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '20/min',
+        'login_account': '5/min',
+        'feed': '120/min',
+        'feed_anon': '60/min',
+        'reactions': '30/min',
+        'comments': '10/min',
+        'payments': '5/min',
+        'auth': '10/min',
+        'user': '60/min',
+        'events': '10/min',
+    }
+}
+
+# Throttle scopes for third-party views: the first prefix of
+# "<module>.<view>.<action>" that matches. Endpoints that take or mail out
+# credentials get "auth"; the rest (users/me, token refresh) get "user".
+THROTTLE_VIEW_SCOPES = {
+    'djoser.views.UserViewSet.create': 'auth',
+    'djoser.views.UserViewSet.activation': 'auth',
+    'djoser.views.UserViewSet.resend_activation': 'auth',
+    'djoser.views.UserViewSet.reset_password': 'auth',
+    'djoser.views.UserViewSet.set_password': 'auth',
+    'djoser.': 'user',
+    'rest_framework_simplejwt.': 'user',
 }
 
 SIMPLE_JWT = {
@@ -193,16 +304,152 @@ SIMPLE_JWT = {
     "USER_ID_CLAIM": "user_id",
 }
 
+# Seconds profile stats (users/stats.py) stay cached; writes invalidate them sooner
+PROFILE_STATS_CACHE_TIMEOUT = 300
 
-cloudinary.config( 
-    cloud_name = config('cloudname'), 
-    api_key = config('cloudinary_api_key'), 
-    api_secret = config('cloudinary_api_secret'), # Click 'View API Keys' above to copy your API secret
-    secure=True
-)
+# Seconds a resolved user stays cached by CachedJWTAuthentication
+JWT_USER_CACHE_TIMEOUT = config('JWT_USER_CACHE_TIMEOUT', default=60, cast=int)
+
+# Local memory by default; set REDIS_URL to share the cache between workers
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Read by cloudinary_storage; PostsConfig.ready() configures the cloudinary
+# SDK from it, so the settings module itself imports nothing heavy.
+CLOUDINARY_STORAGE = {
+    'CLOUD_NAME': config('cloudname'),
+    'API_KEY': config('cloudinary_api_key'),
+    'API_SECRET': config('cloudinary_api_secret'),
+}
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Background user deletion (posts/deletion.py). Jobs start in a thread
+# after commit; `manage.py process_deletion_jobs` runs anything left over.
+DELETION_CHUNK_SIZE = 1000
+DELETION_RUN_IN_THREAD = config('DELETION_RUN_IN_THREAD', default=True, cast=bool)
+
+# Rows fetched per server-side cursor round trip by data exports (posts/exports.py)
+EXPORT_CHUNK_SIZE = 2000
+
+# Batch post creation (posts/batch.py)
+POST_BATCH_MAX_ITEMS = 500
+BULK_CREATE_BATCH_SIZE = 500
+# Concurrent Cloudinary uploads per process
+MEDIA_UPLOAD_WORKERS = config('MEDIA_UPLOAD_WORKERS', default=8, cast=int)
+
+# Background tasks (api/taskqueue.py). DISPATCH is "thread" (start after
+# commit in this process), "worker" (only `manage.py run_tasks`) or
+# "inline" (run after commit in the request; tests, and serverless, where
+# work left running after the response is cut off). Retries and delayed
+# tasks need `manage.py run_tasks` running, or `run_tasks --once` from cron.
+TASK_QUEUE = {
+    'DISPATCH': config(
+        'TASK_QUEUE_DISPATCH',
+        default='inline' if DEPLOYMENT_PROFILE == 'serverless' else 'thread'
+    ),
+    'CONCURRENCY': config('TASK_QUEUE_CONCURRENCY', default=4, cast=int),
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_SECONDS': 10,
+    'BACKOFF_MAX_SECONDS': 3600,
+    'LEASE_SECONDS': 300,
+    'POLL_SECONDS': 1,
+    # calls of a batched task (email) leased and run together
+    'BATCH_SIZE': config('TASK_QUEUE_BATCH_SIZE', default=50, cast=int),
+}
+
+# Background inspection of Post.video_url (posts/media.py). New URLs are
+# probed by a queued task; `manage.py inspect_media` runs anything left over.
+MEDIA_INSPECT = {
+    'CONCURRENCY': config('MEDIA_INSPECT_CONCURRENCY', default=8, cast=int),
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 5,
+    # overall limit per URL, all of its requests included
+    'DEADLINE': 15,
+    # leading bytes fetched to find an MP4's duration
+    'PROBE_BYTES': 64 * 1024,
+    'MAX_REDIRECTS': 5,
+    # hosts exempt from the public-address check (local test servers)
+    'ALLOWED_PRIVATE_HOSTS': [],
+}
+
+# Live activity stream (posts/realtime.py). The in-process broker only
+# reaches clients of the same process; use RedisBroker with REDIS_URL when
+# running several.
+REALTIME_BROKER = config('REALTIME_BROKER', default='posts.realtime.InProcessBroker')
+REALTIME_COALESCE_SECONDS = 1
+REALTIME_HEARTBEAT_SECONDS = 15
+REALTIME_QUEUE_SIZE = 100
+REALTIME_MAX_POSTS = 50
+
+# Trending posts (posts/activity.py), ranked from hourly activity buckets
+TRENDING_WINDOW_HOURS = 48
+TRENDING_HALF_LIFE_HOURS = 6
+
+# "Top" feed scores (posts/ranking.py); refresh aging posts periodically
+# with `manage.py refresh_post_scores`
+RANKING_GRAVITY = 1.5
+RANKING_COMMENT_WEIGHT = 2
+RANKING_COMMENT_HOURS = 24
+RANKING_MAX_AGE_DAYS = 7
+
+# Payment gateway (posts/gateway.py). BASE_URL overrides the sandbox/live
+# host, e.g. to point at a local fake gateway.
+SSLCOMMERZ = {
+    'STORE_ID': config('SSLCOMMERZ_STORE_ID', default='snapb69aef72da647b'),
+    'STORE_PASS': config('SSLCOMMERZ_STORE_PASS', default='snapb69aef72da647b@ssl'),
+    'IS_SANDBOX': config('SSLCOMMERZ_IS_SANDBOX', default=True, cast=bool),
+    'BASE_URL': config('SSLCOMMERZ_BASE_URL', default=''),
+    'CONNECT_TIMEOUT': config('SSLCOMMERZ_CONNECT_TIMEOUT', default=3.05, cast=float),
+    'READ_TIMEOUT': config('SSLCOMMERZ_READ_TIMEOUT', default=10, cast=float),
+    'POOL_MAXSIZE': 10,
+    'BREAKER_FAILURE_THRESHOLD': 5,
+    'BREAKER_RESET_TIMEOUT': 30,
+}
+
+# A payment still pending this long after checkout is looked up at the
+# gateway by a queued task (posts/payments.py)
+PAYMENT_RECONCILE_AFTER_SECONDS = 30 * 60
+
+# Mail is queued as tasks (api/mail.py); the task sends it with EMAIL_DELIVERY_BACKEND.
+# Serverless sends straight over SMTP: with inline dispatch the request would
+# otherwise wait out the batch window too, and the batcher's connection does
+# not outlive the invocation. Signup there waits on one SMTP exchange; a
+# failed send stays queued for `run_tasks --once`.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='api.mail.QueuedEmailBackend')
+EMAIL_DELIVERY_BACKEND = config(
+    'EMAIL_DELIVERY_BACKEND',
+    default=(
+        'django.core.mail.backends.smtp.EmailBackend' if DEPLOYMENT_PROFILE == 'serverless'
+        else 'api.mail.BatchingEmailBackend'
+    )
+)
+
+# BatchingEmailBackend: messages are sent over one reused connection of
+# BACKEND (use locmem or filebased in tests), in batches of MAX_SIZE or
+# whatever arrived within MAX_WAIT_SECONDS
+EMAIL_BATCH = {
+    'BACKEND': config('EMAIL_BATCH_BACKEND', default='django.core.mail.backends.smtp.EmailBackend'),
+    'MAX_SIZE': config('EMAIL_BATCH_MAX_SIZE', default=50, cast=int),
+    'MAX_WAIT_SECONDS': config('EMAIL_BATCH_MAX_WAIT_SECONDS', default=0.5, cast=float),
+    # close the connection after this long without mail
+    'IDLE_SECONDS': 30,
+    # how long a sender waits for its message to go out
+    'SEND_TIMEOUT': 60,
+}
 
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_PORT = config('EMAIL_PORT', cast=int)
@@ -241,4 +488,14 @@ SWAGGER_SETTINGS = {
         }
     },
     'STATIC_URL': '/static/',
-}
\ No newline at end of file
+}
+
+# API docs (SnapBook/docs.py). The schema is prebuilt with
+# `manage.py build_openapi_schema`; live mode regenerates it per request.
+OPENAPI_SCHEMA_LIVE = config('OPENAPI_SCHEMA_LIVE', default=DEBUG, cast=bool)
+OPENAPI_SCHEMA_DIR = BASE_DIR / 'SnapBook' / 'schema'
+OPENAPI_SCHEMA_CACHE_SECONDS = 60 * 60 * 24
+
+if not OPENAPI_SCHEMA_LIVE:
+    SWAGGER_SETTINGS['SPEC_URL'] = 'openapi-schema-json'
+    REDOC_SETTINGS = {'SPEC_URL': 'openapi-schema-json'}
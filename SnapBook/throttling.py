@@ -0,0 +1,121 @@
+"""
+Token-bucket throttling per scope and client.
+
+Implemented as GCRA: the only state per (scope, client) is one integer,
+the bucket's "theoretical arrival time" in milliseconds, moved forward with
+the cache's atomic incr() and handed back when a request is refused. A
+rate of "30/min" allows a burst of 30 requests and refills one every two
+seconds.
+
+Views pick a scope with `throttle_scope`, or per action with
+`throttle_scopes`; third-party views (djoser, simplejwt) get one from
+THROTTLE_VIEW_SCOPES by "<module>.<view>.<action>" prefix. Anonymous
+clients are keyed by IP and use the "<scope>_anon" rate when there is one.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+    cache_format = 'throttle_tb_%(scope)s_%(ident)s'
+
+    def get_scope(self, view):
+        if self.scope:
+            return self.scope
+
+        scopes = getattr(view, 'throttle_scopes', {})
+        action = getattr(view, 'action', None)
+        if action in scopes:
+            return scopes[action]
+
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+
+        path = f"{type(view).__module__}.{type(view).__qualname__}.{action or ''}"
+        for prefix, scope in settings.THROTTLE_VIEW_SCOPES.items():
+            if path.startswith(prefix):
+                return scope
+        return None
+
+    def get_rate(self, scope, anonymous):
+        """(requests, seconds) for the scope, e.g. "30/min" -> (30, 60)."""
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        rate = anonymous and rates.get(f'{scope}_anon') or rates.get(scope)
+        if not rate:
+            return None
+        num, period = rate.split('/')
+        return int(num), DURATIONS[period[0]]
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        scope = self.get_scope(view)
+        if not scope:
+            return True
+
+        anonymous = not (request.user and request.user.is_authenticated)
+        rate = self.get_rate(scope, anonymous)
+        if not rate:
+            return True
+
+        capacity, duration = rate
+        # milliseconds per token and the debt a full bucket can absorb
+        interval = int(duration * 1000 / capacity)
+        burst = interval * (capacity - 1)
+        ttl = duration + 1
+
+        ident = self.get_ident(request) if anonymous else request.user.pk
+        key = self.cache_format % {'scope': scope, 'ident': ident}
+        now = int(time.time() * 1000)
+
+        tat = self._reserve(key, interval, now, ttl)
+        if tat - interval <= now + burst:
+            return True
+
+        # refused: give the reservation back
+        try:
+            cache.decr(key, interval)
+        except ValueError:
+            pass
+        self.retry_after = (tat - interval - burst - now) / 1000
+        return False
+
+    def _reserve(self, key, interval, now, ttl):
+        """Advance the bucket's arrival time by one request and return it."""
+        try:
+            tat = cache.incr(key, interval)
+        except ValueError:
+            tat = None
+
+        if tat is None or tat - interval < now:
+            # new or idle bucket: it starts full from now. Concurrent resets
+            # land on (almost) the same value, so a plain set is enough.
+            tat = now + interval
+            cache.set(key, tat, ttl)
+        else:
+            cache.touch(key, ttl)
+        return tat
+
+    def wait(self):
+        return self.retry_after
+
+
+class PaymentThrottle(TokenBucketThrottle):
+    scope = 'payments'
+
+
+class AuthThrottle(TokenBucketThrottle):
+    scope = 'auth'
+
+
+class EventStreamThrottle(TokenBucketThrottle):
+    """Opening /api/events/ streams; used directly by the async view."""
+
+    scope = 'events'
@@ -16,35 +16,25 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from debug_toolbar.toolbar import debug_toolbar_urls
+from .docs import docs_view, schema_view
 from .views import api_root_view
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from django.conf import settings
 from django.conf.urls.static import static
 
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="SnapBook - Social Media API",
-      default_version='v1',
-      description="API documentation for SnapBook Social-Media platform",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@snapbook.com"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
-
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
     path('api/', include('api.urls'), name='api-root'),
     path('', api_root_view),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
-]+ debug_toolbar_urls()
+    path('swagger/', docs_view('swagger'), name='schema-swagger-ui'),
+    path('redoc/', docs_view('redoc'), name='schema-redoc'),
+    path('openapi.json', schema_view('json'), name='openapi-schema-json'),
+    path('openapi.yaml', schema_view('yaml'), name='openapi-schema-yaml'),
+]
+
+if settings.ENABLE_DEBUG_TOOLBAR:
+    from debug_toolbar.toolbar import debug_toolbar_urls
+    urlpatterns += debug_toolbar_urls()
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
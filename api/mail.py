@@ -0,0 +1,269 @@
+"""
+Email through the task queue. QueuedEmailBackend (the EMAIL_BACKEND) only
+stores each message as a task; the task hands it to EMAIL_DELIVERY_BACKEND,
+so unless tasks are dispatched inline, signup and password-reset requests
+never wait on the mail server.
+
+Workers lease due send_email tasks together (up to TASK_QUEUE['BATCH_SIZE'])
+and deliver them in one call. The default delivery backend,
+BatchingEmailBackend, passes them to one sender thread per process. It sends
+them in batches of up to EMAIL_BATCH['MAX_SIZE'], or whatever arrived within
+MAX_WAIT_SECONDS, over a single connection of EMAIL_BATCH['BACKEND'] (SMTP,
+or locmem/filebased in tests) kept open between batches until it has been
+idle for IDLE_SECONDS. Serverless deployments, which dispatch inline, send
+directly over SMTP instead (see EMAIL_DELIVERY_BACKEND in settings).
+Delivery latency, batch timings and sent/failed counters are recorded in
+SnapBook.metrics under "email.".
+"""
+import base64
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+
+from SnapBook import metrics
+from api.taskqueue import task
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def serialize_message(message):
+    attachments = []
+    for attachment in message.attachments:
+        filename, content, mimetype = attachment
+        if isinstance(content, bytes):
+            attachments.append([filename, base64.b64encode(content).decode(), mimetype, True])
+        else:
+            attachments.append([filename, content, mimetype, False])
+
+    return {
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': list(message.to),
+        'cc': list(message.cc),
+        'bcc': list(message.bcc),
+        'reply_to': list(message.reply_to),
+        'headers': dict(message.extra_headers),
+        'content_subtype': message.content_subtype,
+        'alternatives': [list(alternative) for alternative in getattr(message, 'alternatives', [])],
+        'attachments': attachments,
+    }
+
+
+def deserialize_message(data):
+    message = EmailMultiAlternatives(
+        subject=data['subject'],
+        body=data['body'],
+        from_email=data['from_email'],
+        to=data['to'],
+        cc=data['cc'],
+        bcc=data['bcc'],
+        reply_to=data['reply_to'],
+        headers=data['headers'],
+    )
+    message.content_subtype = data['content_subtype']
+    for content, mimetype in data['alternatives']:
+        message.attach_alternative(content, mimetype)
+    for filename, content, mimetype, encoded in data['attachments']:
+        message.attach(filename, base64.b64decode(content) if encoded else content, mimetype)
+    return message
+
+
+def deliver(messages):
+    """
+    Send `messages` with EMAIL_DELIVERY_BACKEND over one connection.
+    Returns the exception each message failed with, or None, in order.
+    """
+    connection = get_connection(settings.EMAIL_DELIVERY_BACKEND, fail_silently=False)
+    if isinstance(connection, BatchingEmailBackend):
+        return connection.send_each(messages)
+
+    errors = []
+    with connection:
+        for message in messages:
+            try:
+                connection.send_messages([message])
+            except Exception as exc:
+                errors.append(exc)
+            else:
+                errors.append(None)
+    return errors
+
+
+@task
+def send_email(data):
+    error, = deliver([deserialize_message(data)])
+    if error is not None:
+        raise error
+
+
+@send_email.batch
+def send_emails(calls):
+    return deliver([deserialize_message(*args, **kwargs) for args, kwargs in calls])
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+
+    def send_messages(self, email_messages):
+        sent = 0
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            try:
+                send_email.delay(serialize_message(message))
+            except Exception:
+                if not self.fail_silently:
+                    raise
+                continue
+            sent += 1
+        return sent
+
+
+class _Outgoing:
+    __slots__ = ('message', 'future', 'queued_at')
+
+    def __init__(self, message):
+        self.message = message
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+
+class EmailBatcher:
+    """Sends queued messages in batches over one reused connection."""
+
+    def __init__(self, backend, max_size, max_wait, idle):
+        self.backend = backend
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.idle = idle
+        self.connection = None
+        self._queue = []
+        self._ready = threading.Condition()
+        threading.Thread(target=self._run, name='email-batcher', daemon=True).start()
+
+    def submit(self, messages):
+        outgoing = [_Outgoing(message) for message in messages]
+        with self._ready:
+            self._queue.extend(outgoing)
+            self._ready.notify()
+        return [item.future for item in outgoing]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
+            else:
+                self._close()
+
+    def _next_batch(self):
+        """Wait for a full or old enough batch; [] once the connection has idled out."""
+        with self._ready:
+            idle_at = time.monotonic() + self.idle
+            while True:
+                now = time.monotonic()
+                if self._queue:
+                    waited = now - self._queue[0].queued_at
+                    if len(self._queue) >= self.max_size or waited >= self.max_wait:
+                        batch = self._queue[:self.max_size]
+                        del self._queue[:self.max_size]
+                        return batch
+                    self._ready.wait(self.max_wait - waited)
+                elif self.connection is None:
+                    self._ready.wait()
+                elif now >= idle_at:
+                    return []
+                else:
+                    self._ready.wait(idle_at - now)
+
+    def _send(self, batch):
+        started = time.monotonic()
+        for item in batch:
+            try:
+                self._deliver(item.message)
+            except Exception as exc:
+                metrics.increment('email.failed')
+                item.future.set_exception(exc)
+                continue
+            metrics.increment('email.sent')
+            metrics.observe('email.delivery_latency', time.monotonic() - item.queued_at)
+            item.future.set_result(True)
+
+        metrics.increment('email.batches')
+        metrics.observe('email.batch_send', time.monotonic() - started)
+
+    def _deliver(self, message):
+        for attempt in range(2):
+            if self.connection is None:
+                connection = get_connection(self.backend, fail_silently=False)
+                connection.open()
+                self.connection = connection
+                metrics.increment('email.connections_opened')
+            try:
+                self.connection.send_messages([message])
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # the server dropped the kept-alive connection: reconnect once
+                self._close()
+                if attempt:
+                    raise
+
+    def _close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+def get_batcher():
+    global _batcher
+
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                options = settings.EMAIL_BATCH
+                _batcher = EmailBatcher(
+                    options['BACKEND'],
+                    options['MAX_SIZE'],
+                    options['MAX_WAIT_SECONDS'],
+                    options['IDLE_SECONDS'],
+                )
+    return _batcher
+
+
+class BatchingEmailBackend(BaseEmailBackend):
+    """
+    Hands messages to the process's EmailBatcher and waits until they are
+    sent, so a failure still reaches the caller (and retries the task).
+    """
+
+    def send_each(self, messages):
+        """Submit `messages` together; the exception each failed with, or None."""
+        errors = []
+        for future in get_batcher().submit(messages):
+            try:
+                future.result(timeout=settings.EMAIL_BATCH['SEND_TIMEOUT'])
+            except Exception as exc:
+                errors.append(exc)
+            else:
+                errors.append(None)
+        return errors
+
+    def send_messages(self, email_messages):
+        messages = [message for message in email_messages if message.recipients()]
+        if not messages:
+            return 0
+
+        errors = self.send_each(messages)
+        for error in errors:
+            if error is not None and not self.fail_silently:
+                raise error
+        return errors.count(None)
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from SnapBook.docs import SCHEMA_FORMATS, generate_schema, schema_path
+
+
+class Command(BaseCommand):
+    help = "Write the OpenAPI schema served at /openapi.json and /openapi.yaml."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="Only report whether the built schema is up to date (for CI).")
+
+    def handle(self, *args, **options):
+        stale = []
+
+        for fmt in SCHEMA_FORMATS:
+            path = schema_path(fmt)
+            content = generate_schema(fmt)
+            if path.exists() and path.read_bytes() == content:
+                continue
+
+            stale.append(path.name)
+            if not options["check"]:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(content)
+
+        if options["check"] and stale:
+            raise CommandError(f"Out of date: {', '.join(stale)}. Run build_openapi_schema.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {', '.join(stale)}" if stale else "Schema is up to date"
+        ))
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a fresh worker does before serving its first request
+STARTUP = (
+    "from django.core.wsgi import get_wsgi_application; "
+    "get_wsgi_application(); "
+    "from django.urls import get_resolver; "
+    "get_resolver().url_patterns"
+)
+
+
+def parse_importtime(output):
+    """Yield (module, self_us, cumulative_us) from `python -X importtime` output."""
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            yield name.strip(), int(self_us), int(cumulative_us)
+        except ValueError:
+            # the header line
+            continue
+
+
+class Command(BaseCommand):
+    help = "Measure what a cold start spends importing, per package and per module."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=15,
+                            help="Rows to show in each table.")
+        parser.add_argument("--budget-ms", type=float, default=None,
+                            help="Fail when total import time exceeds this (for CI).")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"Startup failed:\n{result.stderr[-2000:]}")
+
+        modules = list(parse_importtime(result.stderr))
+        packages = defaultdict(int)
+        for name, self_us, _ in modules:
+            packages[name.split(".")[0]] += self_us
+        total_ms = sum(packages.values()) / 1000
+
+        limit = options["limit"]
+        self.stdout.write(f"{len(modules)} modules imported in {total_ms:.0f} ms\n")
+
+        self.stdout.write("Per package (self time):")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  {package}")
+
+        self.stdout.write("\nPer module (cumulative):")
+        for name, _, cumulative_us in sorted(modules, key=lambda row: -row[2])[:limit]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+        budget = options["budget_ms"]
+        if budget is not None and total_ms > budget:
+            raise CommandError(f"Import time {total_ms:.0f} ms is over the {budget:.0f} ms budget")
@@ -0,0 +1,60 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.taskqueue import claim_due_batches, run_claimed_batch
+
+
+def _run(tasks):
+    close_old_connections()
+    try:
+        return run_claimed_batch(tasks)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks (email, media, payment follow-ups)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=None,
+                            help="Tasks run at the same time (default TASK_QUEUE['CONCURRENCY']).")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit when no task is due instead of polling (for cron).")
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"] or settings.TASK_QUEUE["CONCURRENCY"]
+        poll = settings.TASK_QUEUE["POLL_SECONDS"]
+        running = set()
+        succeeded = failed = 0
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="run-tasks") as pool:
+            try:
+                while True:
+                    free = concurrency - len(running)
+                    # a batch of email tasks takes one slot
+                    batches = claim_due_batches(free) if free else []
+                    running.update(pool.submit(_run, tasks) for tasks in batches)
+
+                    if not running:
+                        if options["once"]:
+                            break
+                        time.sleep(poll)
+                        continue
+
+                    done, running = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future.exception():
+                            self.stderr.write(f"Task runner error: {future.exception()!r}")
+                            failed += 1
+                            continue
+                        succeeded += sum(future.result())
+                        failed += future.result().count(False)
+            except KeyboardInterrupt:
+                self.stderr.write("Stopping, waiting for running tasks")
+                wait(running)
+
+        self.stdout.write(self.style.SUCCESS(f"Ran {succeeded} tasks, {failed} failed or retried"))
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-19 19:33
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_task'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='task',
+            name='payload',
+        ),
+    ]
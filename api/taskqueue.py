@@ -0,0 +1,245 @@
+"""
+A small database-backed task queue for work that should not hold up a
+request: email delivery, media inspection, gateway follow-ups.
+
+Functions decorated with @task are queued with `.delay(...)` or
+`.enqueue(...)`, which insert a Task row in the caller's transaction, so a
+task never runs for data that was rolled back. How rows get run is set by
+TASK_QUEUE['DISPATCH']:
+
+  "worker"  only `manage.py run_tasks` runs them
+  "thread"  a process-wide pool starts them after commit as well (the
+            worker, or a periodic `run_tasks --once`, still handles retries
+            and delayed tasks)
+  "inline"  they run in the committing thread (tests, local development)
+
+Workers claim rows with a conditional UPDATE and hold them for
+LEASE_SECONDS, so several workers and the thread pool never run the same
+task twice. Calls of a task with a batch handler (`@some_task.batch`) that
+are due together are leased and run as one batch of up to
+TASK_QUEUE['BATCH_SIZE']. A failing task is retried with exponential backoff until
+max_attempts, then kept as failed with its last error. Succeeded tasks are
+deleted.
+"""
+import functools
+import logging
+import random
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api.models import Task
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class Retry(Exception):
+    """Raised by a task to be run again later without logging a traceback."""
+
+
+class TaskFunction:
+
+    def __init__(self, func, max_attempts=None):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = f"{func.__module__}.{func.__qualname__}"
+        self.max_attempts = max_attempts
+        self.batch_func = None
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.enqueue(args, kwargs)
+
+    def enqueue(self, args=(), kwargs=None, countdown=0):
+        """Queue a call, to run no sooner than `countdown` seconds from now."""
+        task = Task.objects.create(
+            name=self.name,
+            args=list(args),
+            kwargs=kwargs or {},
+            max_attempts=self.max_attempts or settings.TASK_QUEUE['MAX_ATTEMPTS'],
+            run_at=timezone.now() + timedelta(seconds=countdown),
+        )
+        if not countdown:
+            _dispatch_on_commit(task.pk)
+        return task
+
+    def batch(self, func):
+        """
+        Register `func(calls)` to run several due calls of this task at once.
+        It gets a list of (args, kwargs) and returns, in the same order, the
+        exception each call failed with, or None.
+        """
+        self.batch_func = func
+        return func
+
+
+def task(func=None, *, max_attempts=None):
+    """Make `func` queueable. Arguments must be JSON serializable."""
+    if func is None:
+        return functools.partial(task, max_attempts=max_attempts)
+    return TaskFunction(func, max_attempts)
+
+
+def get_pool():
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=settings.TASK_QUEUE['CONCURRENCY'],
+                    thread_name_prefix='tasks'
+                )
+    return _pool
+
+
+def _dispatch_on_commit(task_id):
+    mode = settings.TASK_QUEUE['DISPATCH']
+    if mode == 'inline':
+        transaction.on_commit(lambda: run_claimed(claim(task_id)))
+    elif mode == 'thread':
+        transaction.on_commit(lambda: get_pool().submit(_run_in_thread, task_id))
+
+
+def _run_in_thread(task_id):
+    close_old_connections()
+    try:
+        task = claim(task_id)
+        if task is not None:
+            run_claimed_batch(_fill_batch([task]))
+    finally:
+        close_old_connections()
+
+
+def _claimable(now):
+    return Q(status=Task.PENDING, run_at__lte=now) | Q(status=Task.RUNNING, locked_until__lt=now)
+
+
+def claim(task_id):
+    """Lease one task to the caller. Returns the Task, or None if it is taken or not due."""
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.TASK_QUEUE['LEASE_SECONDS'])
+    claimed = Task.objects.filter(_claimable(now), pk=task_id).update(
+        status=Task.RUNNING,
+        locked_until=lease,
+        attempts=F('attempts') + 1
+    )
+    return Task.objects.filter(pk=task_id).first() if claimed else None
+
+
+def claim_due(limit, name=None):
+    """Lease up to `limit` due tasks, oldest first."""
+    due = Task.objects.filter(_claimable(timezone.now()))
+    if name is not None:
+        due = due.filter(name=name)
+    candidates = (
+        due.order_by('run_at')
+        .values_list('pk', flat=True)[:limit * 2]
+    )
+    tasks = []
+    for task_id in candidates:
+        task = claim(task_id)
+        if task:
+            tasks.append(task)
+            if len(tasks) == limit:
+                break
+    return tasks
+
+
+def _batch_func(name):
+    try:
+        return import_string(name).batch_func
+    except (ImportError, AttributeError):
+        # run_claimed records the error
+        return None
+
+
+def _fill_batch(tasks):
+    """Lease more due calls of a batched task to run with `tasks`."""
+    name = tasks[0].name
+    if _batch_func(name) is None:
+        return tasks
+    return tasks + claim_due(max(settings.TASK_QUEUE['BATCH_SIZE'] - len(tasks), 0), name=name)
+
+
+def claim_due_batches(limit):
+    """
+    Lease up to `limit` runs of due tasks, each a list for run_claimed_batch:
+    a single task, or up to TASK_QUEUE['BATCH_SIZE'] calls of a batched task.
+    """
+    runs = []
+    batched = {}
+    for task in claim_due(limit):
+        if _batch_func(task.name) is None:
+            runs.append([task])
+            continue
+        current = batched.get(task.name)
+        if current is None or len(current) >= settings.TASK_QUEUE['BATCH_SIZE']:
+            current = batched[task.name] = []
+            runs.append(current)
+        current.append(task)
+    return [_fill_batch(run) for run in runs]
+
+
+def backoff(attempts):
+    options = settings.TASK_QUEUE
+    delay = min(options['BACKOFF_MAX_SECONDS'], options['BACKOFF_SECONDS'] * 2 ** (attempts - 1))
+    # jitter keeps a burst of failures from retrying in lockstep
+    return delay * random.uniform(0.5, 1)
+
+
+def run_claimed(task):
+    """Run a leased task and record the outcome. Returns True on success."""
+    if task is None:
+        return False
+
+    try:
+        func = import_string(task.name)
+        func.func(*task.args, **task.kwargs)
+    except Exception as exc:
+        return _finish(task, exc)
+    return _finish(task, None)
+
+
+def run_claimed_batch(tasks):
+    """Run leased calls of one task together. Returns True or False for each."""
+    batch_func = _batch_func(tasks[0].name)
+    if len(tasks) == 1 or batch_func is None:
+        return [run_claimed(task) for task in tasks]
+
+    try:
+        errors = batch_func([(task.args, task.kwargs) for task in tasks])
+    except Exception as exc:
+        errors = [exc] * len(tasks)
+    return [_finish(task, error) for task, error in zip(tasks, errors)]
+
+
+def _finish(task, exc):
+    if exc is None:
+        Task.objects.filter(pk=task.pk).delete()
+        return True
+
+    if isinstance(exc, Retry):
+        error = f"Retry: {exc}"
+    else:
+        error = ''.join(traceback.format_exception(exc))
+        logger.warning("Task %s #%s failed (attempt %s)", task.name, task.pk, task.attempts, exc_info=exc)
+
+    fields = {'status': Task.FAILED, 'locked_until': None, 'last_error': error[-4000:]}
+    if task.attempts < task.max_attempts:
+        fields['status'] = Task.PENDING
+        fields['run_at'] = timezone.now() + timedelta(seconds=backoff(task.attempts))
+    Task.objects.filter(pk=task.pk, status=Task.RUNNING).update(**fields)
+    return False
@@ -1,3 +1,446 @@
-from django.test import TestCase
+import smtplib
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from SnapBook import metrics, replicas
+from api.mail import EmailBatcher
+from api.models import Task
+from api.taskqueue import (
+    Retry, backoff, claim, claim_due, claim_due_batches, run_claimed, run_claimed_batch, task
+)
+from posts.models import Payment
+from users.models import User
+
+calls = []
+
+
+@task
+def record(value):
+    calls.append(value)
+
+
+@task(max_attempts=2)
+def broken():
+    raise RuntimeError("boom")
+
+
+@task
+def not_yet():
+    raise Retry("later")
+
+
+@task
+def collect(value):
+    calls.append([value])
+
+
+@collect.batch
+def collect_many(batch):
+    values = [args[0] for args, kwargs in batch]
+    calls.append(values)
+    return [RuntimeError(value) if value == 'bad' else None for value in values]
+
+
+class DroppingEmailBackend(locmem.EmailBackend):
+    """locmem, but the server hangs up on the next `drops` sends."""
+
+    drops = 0
+
+    def send_messages(self, messages):
+        if DroppingEmailBackend.drops:
+            DroppingEmailBackend.drops -= 1
+            raise smtplib.SMTPServerDisconnected('connection unexpectedly closed')
+        return super().send_messages(messages)
+
+
+def counter(name):
+    return metrics.snapshot()['counters'].get(name, 0)
+
+
+def queue_settings(**options):
+    return override_settings(TASK_QUEUE={**settings.TASK_QUEUE, 'DISPATCH': 'worker', **options})
+
+
+@queue_settings()
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_leases_a_task_once(self):
+        queued = record.delay('a')
+
+        claimed = claim(queued.pk)
+        self.assertEqual(claimed.status, Task.RUNNING)
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNone(claim(queued.pk))
+        self.assertEqual(claim_due(5), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        queued = record.delay('a')
+        claim(queued.pk)
+        Task.objects.filter(pk=queued.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(claim(queued.pk).attempts, 2)
+
+    def test_countdown_task_is_not_due(self):
+        record.enqueue(args=('a',), countdown=60)
+        self.assertEqual(claim_due(5), [])
+
+    def test_success_deletes_the_task(self):
+        record.delay('a')
+        self.assertTrue(run_claimed(claim_due(1)[0]))
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(Task.objects.exists())
+
+    @queue_settings(BACKOFF_SECONDS=10, BACKOFF_MAX_SECONDS=25)
+    def test_failure_is_retried_with_backoff(self):
+        queued = broken.delay()
+        before = timezone.now()
+        with self.assertLogs('api.taskqueue', 'WARNING'):
+            self.assertFalse(run_claimed(claim(queued.pk)))
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.PENDING)
+        self.assertIn('RuntimeError: boom', queued.last_error)
+        self.assertGreaterEqual(queued.run_at, before + timedelta(seconds=5))
+        self.assertLessEqual(queued.run_at, timezone.now() + timedelta(seconds=10))
+
+        for attempts, low, high in ((1, 5, 10), (2, 10, 20), (3, 12.5, 25), (10, 12.5, 25)):
+            self.assertTrue(low <= backoff(attempts) <= high)
+
+    def test_max_attempts_marks_the_task_failed(self):
+        queued = broken.delay()
+        for _ in range(2):
+            Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+            with self.assertLogs('api.taskqueue', 'WARNING'):
+                run_claimed(claim(queued.pk))
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertEqual(queued.attempts, 2)
+        self.assertIsNone(claim(queued.pk))
+
+    def test_retry_reschedules_without_traceback(self):
+        queued = not_yet.delay()
+        run_claimed(claim(queued.pk))
+
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.PENDING)
+        self.assertEqual(queued.last_error, 'Retry: later')
+
+    @queue_settings(DISPATCH='inline')
+    def test_inline_dispatch_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record.delay('a')
+            self.assertEqual(calls, [])
+
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_claim_due_takes_oldest_first(self):
+        for value in 'abc':
+            record.delay(value)
+
+        for queued in claim_due(2):
+            run_claimed(queued)
+
+        self.assertEqual(calls, ['a', 'b'])
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_due_calls_of_a_batched_task_run_together(self):
+        record.delay('x')
+        for value in ('a', 'bad', 'b'):
+            collect.delay(value)
+
+        runs = claim_due_batches(2)
+        self.assertEqual([[queued.name for queued in run] for run in runs], [
+            ['api.tests.record'],
+            ['api.tests.collect'] * 3,
+        ])
+        with self.assertLogs('api.taskqueue', 'WARNING'):
+            outcomes = [run_claimed_batch(run) for run in runs]
+
+        self.assertEqual(outcomes, [[True], [True, False, True]])
+        self.assertEqual(calls, ['x', ['a', 'bad', 'b']])
+        failed = Task.objects.get()
+        self.assertEqual((failed.status, failed.args), (Task.PENDING, ['bad']))
+        self.assertIn('RuntimeError: bad', failed.last_error)
+
+    @queue_settings(BATCH_SIZE=2)
+    def test_batches_are_capped(self):
+        for value in 'abcde':
+            collect.delay(value)
+
+        runs = claim_due_batches(3)
+        self.assertEqual([len(run) for run in runs], [2, 2])
+        for run in runs:
+            run_claimed_batch(run)
+        self.assertEqual(calls, [['a', 'b'], ['c', 'd']])
+
+    def test_single_call_runs_the_task_itself(self):
+        collect.delay('a')
+        self.assertEqual(run_claimed_batch(claim_due_batches(1)[0]), [True])
+        self.assertEqual(calls, [['a']])
+
+
+@override_settings(
+    EMAIL_BACKEND='api.mail.QueuedEmailBackend',
+    EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class QueuedEmailTests(TestCase):
+
+    def message(self):
+        message = EmailMultiAlternatives(
+            subject='Activate', body='text', from_email='from@example.com', to=['to@example.com']
+        )
+        message.attach_alternative('<p>html</p>', 'text/html')
+        message.attach('note.bin', b'\x00\x01', 'application/octet-stream')
+        return message
+
+    @queue_settings(DISPATCH='worker')
+    def test_mail_waits_for_the_queue(self):
+        self.assertEqual(self.message().send(), 1)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Task.objects.get().name, 'api.mail.send_email')
+
+        run_claimed(claim_due(1)[0])
+
+        self.assertEqual(len(mail.outbox), 1)
+        sent = mail.outbox[0]
+        self.assertEqual((sent.subject, sent.to), ('Activate', ['to@example.com']))
+        self.assertEqual(list(sent.alternatives[0]), ['<p>html</p>', 'text/html'])
+        self.assertEqual(sent.attachments[0][1], b'\x00\x01')
+
+    @queue_settings(DISPATCH='inline')
+    def test_inline_dispatch_delivers_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.message().send()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(Task.objects.exists())
+
+    @queue_settings(DISPATCH='worker')
+    @override_settings(
+        EMAIL_DELIVERY_BACKEND='api.mail.BatchingEmailBackend',
+        EMAIL_BATCH={
+            **settings.EMAIL_BATCH,
+            'BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            'MAX_SIZE': 6,
+            'MAX_WAIT_SECONDS': 30,
+        },
+    )
+    @mock.patch('api.mail._batcher', None)
+    def test_worker_sends_due_mail_as_one_batch(self):
+        for _ in range(6):
+            self.message().send()
+        batches, opened = counter('email.batches'), counter('email.connections_opened')
+
+        runs = claim_due_batches(4)
+        self.assertEqual([len(run) for run in runs], [6])
+        # the whole claim reaches the batcher at once, so it is sent without waiting
+        self.assertEqual(run_claimed_batch(runs[0]), [True] * 6)
+
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(counter('email.batches') - batches, 1)
+        self.assertEqual(counter('email.connections_opened') - opened, 1)
+
+
+class EmailBatcherTests(SimpleTestCase):
+
+    LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+
+    def setUp(self):
+        self.before = metrics.snapshot()
+        DroppingEmailBackend.drops = 0
+
+    def counted(self, name):
+        return counter(name) - self.before['counters'].get(name, 0)
+
+    def messages(self, count):
+        return [
+            EmailMultiAlternatives(subject=f'm{n}', body='text', to=['to@example.com'])
+            for n in range(count)
+        ]
+
+    def results(self, futures):
+        return [future.result(timeout=5) for future in futures]
+
+    def test_full_batch_is_sent_at_once(self):
+        batcher = EmailBatcher(self.LOCMEM, max_size=3, max_wait=30, idle=30)
+
+        self.assertEqual(self.results(batcher.submit(self.messages(3))), [True] * 3)
+        self.assertEqual([message.subject for message in mail.outbox], ['m0', 'm1', 'm2'])
+        self.assertEqual(self.counted('email.batches'), 1)
+        self.assertEqual(self.counted('email.sent'), 3)
+        self.assertEqual(self.counted('email.connections_opened'), 1)
+        latency = metrics.snapshot()['timings']['email.delivery_latency']['count']
+        self.assertEqual(latency - self.before['timings'].get('email.delivery_latency', {}).get('count', 0), 3)
+
+    def test_partial_batch_is_sent_after_max_wait(self):
+        batcher = EmailBatcher(self.LOCMEM, max_size=50, max_wait=0.3, idle=30)
+        started = time.monotonic()
+
+        futures = batcher.submit(self.messages(1))
+        time.sleep(0.05)
+        futures += batcher.submit(self.messages(1))
+
+        self.assertEqual(self.results(futures), [True, True])
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual(self.counted('email.batches'), 1)
+
+    def test_connection_is_kept_open_until_idle(self):
+        batcher = EmailBatcher(self.LOCMEM, max_size=1, max_wait=0, idle=0.2)
+
+        self.results(batcher.submit(self.messages(1)))
+        self.results(batcher.submit(self.messages(1)))
+        self.assertEqual(self.counted('email.batches'), 2)
+        self.assertEqual(self.counted('email.connections_opened'), 1)
+
+        deadline = time.monotonic() + 5
+        while batcher.connection is not None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertIsNone(batcher.connection)
+
+    def test_dropped_connection_is_reopened(self):
+        DroppingEmailBackend.drops = 1
+        batcher = EmailBatcher('api.tests.DroppingEmailBackend', max_size=1, max_wait=0, idle=30)
+
+        self.assertEqual(self.results(batcher.submit(self.messages(1))), [True])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.counted('email.connections_opened'), 2)
+        self.assertEqual(self.counted('email.sent'), 1)
+
+    def test_second_drop_fails_the_message(self):
+        DroppingEmailBackend.drops = 2
+        batcher = EmailBatcher('api.tests.DroppingEmailBackend', max_size=1, max_wait=0, idle=30)
+
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            batcher.submit(self.messages(1))[0].result(timeout=5)
+        self.assertEqual(self.results(batcher.submit(self.messages(1))), [True])
+        self.assertEqual(self.counted('email.failed'), 1)
+        self.assertEqual(self.counted('email.sent'), 1)
+
+
+class ReplicaTests(TestCase):
+    """Reads against an extra SQLite alias standing in for a replica."""
+
+    def setUp(self):
+        cache.clear()
+        replicas._down_until.clear()
+        self.addCleanup(replicas._down_until.clear)
+
+        self.user = User.objects.create_user(email='payer@example.com', password='pw')
+        Payment.objects.create(user=self.user, order_id='o1', transaction_id='', amount=10)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_replica(self, name=':memory:'):
+        alias = 'replica_test'
+        databases = {DEFAULT_DB_ALIAS: {}, alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': name}}
+        config = connections.configure_settings(databases)[alias]
+        # a connection created at runtime, outside DATABASES
+        connections[alias] = load_backend(config['ENGINE']).DatabaseWrapper(config, alias)
+
+        def remove():
+            connections[alias].close()
+            del connections[alias]
+
+        self.addCleanup(remove)
+        override = override_settings(REPLICA_DATABASES=[alias])
+        override.enable()
+        self.addCleanup(override.disable)
+        return alias
+
+    def order_ids(self, **headers):
+        response = self.client.get('/api/payments/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return [payment['order_id'] for payment in response.data]
+
+    def test_reads_go_to_the_replica(self):
+        alias = self.add_replica()
+        with connections[alias].schema_editor() as editor:
+            editor.create_model(Payment)
+
+        self.assertEqual(self.order_ids(), [])
+        self.assertIsNone(replicas.ReplicaRouter().db_for_read(Payment))
+        self.assertEqual(replicas.ReplicaRouter().db_for_write(Payment), DEFAULT_DB_ALIAS)
+
+    def test_recent_writer_reads_the_primary(self):
+        alias = self.add_replica()
+        with connections[alias].schema_editor() as editor:
+            editor.create_model(Payment)
+        # what ReplicaMiddleware stores after a successful write with this token
+        cache.set(replicas._pin_key(RequestFactory().post('/', headers={'Authorization': 'JWT abc'})), 1)
+
+        self.assertEqual(self.order_ids(Authorization='JWT abc'), ['o1'])
+        self.assertEqual(self.order_ids(Authorization='JWT other'), [])
+
+    def test_failed_replica_read_is_run_again_on_the_primary(self):
+        # an empty database: every read raises OperationalError (no such table)
+        alias = self.add_replica()
+
+        self.assertEqual(self.order_ids(), ['o1'])
+        self.assertIn(alias, replicas._down_until)
+        self.assertIsNone(replicas.healthy_replica())
+
+    def test_unreachable_replica_is_skipped(self):
+        alias = self.add_replica('/nonexistent/replica.sqlite3')
+
+        self.assertEqual(self.order_ids(), ['o1'])
+        self.assertIn(alias, replicas._down_until)
+
+
+class MetricsTests(TestCase):
+
+    def test_connection_setup_is_timed(self):
+        alias = 'metrics_test'
+        config = connections.configure_settings({DEFAULT_DB_ALIAS: {}, alias: {'ENGINE': 'SnapBook.db', 'NAME': 'x'}})
+        wrapper = load_backend('SnapBook.db').DatabaseWrapper(config[alias], alias)
+        before = metrics.snapshot()
+
+        parent = 'django.db.backends.postgresql.base.DatabaseWrapper.get_new_connection'
+        with mock.patch(parent, return_value='connection') as connect:
+            self.assertEqual(wrapper.get_new_connection({'dbname': 'x'}), 'connection')
+
+        connect.assert_called_once_with({'dbname': 'x'})
+        after = metrics.snapshot()
+        opened = f'db.connections_opened.{alias}'
+        self.assertEqual(after['counters'][opened] - before['counters'].get(opened, 0), 1)
+        self.assertEqual(after['timings'][f'db.connect.{alias}']['count'], 1)
+
+    def test_admin_only(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/admin/metrics/').status_code, 401)
+
+        client.force_authenticate(User.objects.create_user(email='reader@example.com', password='pw'))
+        self.assertEqual(client.get('/api/admin/metrics/').status_code, 403)
+
+        metrics.increment('tests.metrics_view')
+        client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='pw'))
+        response = client.get('/api/admin/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.data['counters']['tests.metrics_view'], 1)
+        self.assertIn('timings', response.data)
+
+
+class OpenAPISchemaTests(SimpleTestCase):
+
+    def test_committed_schema_is_up_to_date(self):
+        # deployments serve SnapBook/schema/ as committed
+        call_command('build_openapi_schema', '--check', stdout=StringIO())
@@ -1,22 +1,31 @@
 from django.urls import path, include
 from rest_framework_nested import routers
 from posts.views import (    PaymentHistoryViewSet,
+    PaymentReportViewSet,
+    DeletionJobViewSet,
     PostViewSet,
     CommentViewSet,
     MyPostViewSet,
+    AuthorPostViewSet,
+    export_data,
+    activity_events,
     initiate_payment,
     payment_fail,
     payment_success,
     payment_cancel )
-from users.views import UserProfileView, AdminUserViewSet
+from users.views import UserProfileView, AdminUserViewSet, LoginView
+from api.views import MetricsView
 
 router = routers.DefaultRouter()
 
 router.register('posts', PostViewSet, basename='posts')
 router.register('profile', UserProfileView, basename='profile')
 router.register('my-posts', MyPostViewSet, basename='my-posts')
+router.register(r'users/(?P<user_pk>\d+)/posts', AuthorPostViewSet, basename='user-posts')
 router.register('admin/users', AdminUserViewSet, basename='admin-users')
 router.register("payments", PaymentHistoryViewSet, basename="payments")
+router.register("admin/payment-reports", PaymentReportViewSet, basename="admin-payment-reports")
+router.register("admin/deletion-jobs", DeletionJobViewSet, basename="admin-deletion-jobs")
 
 posts_router = routers.NestedDefaultRouter(router, 'posts', lookup='post')
 posts_router.register('comments', CommentViewSet, basename='post-comments')
@@ -33,10 +42,14 @@ urlpatterns = [
     path('', include(router.urls)),
     path('', include(posts_router.urls)),
     path('', include(my_posts_router.urls)),
+    path('auth/jwt/create/', LoginView.as_view(), name='jwt-create'),
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),
     path("payment/initiate/", initiate_payment, name="initiate-payment"),
     path("payment/success/", payment_success, name="payment-success"),
     path("payment/cancel/", payment_cancel, name="payment-cancel"),
     path("payment/fail/", payment_fail, name="payment-fail"),
+    path("export/", export_data, name="export-data"),
+    path("events/", activity_events, name="activity-events"),
+    path("admin/metrics/", MetricsView.as_view(), name="admin-metrics"),
 ]
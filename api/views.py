@@ -1,3 +1,14 @@
-from django.shortcuts import render
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from SnapBook import metrics
+
+
+class MetricsView(APIView):
+    """Per-process counters and timings (admin only)."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.snapshot())
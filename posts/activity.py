@@ -0,0 +1,135 @@
+"""
+Hourly per-post activity (PostActivity), kept current from the comment and
+reaction write paths so "trending" and "most discussed" only read this
+small table.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.utils import timezone
+
+from posts.models import Post, PostActivity
+from users.stats import invalidate_stats
+
+# weights per ranking mode: (comments, likes, unlikes)
+RANKINGS = {
+    'trending': (2.0, 1.0, -1.0),
+    'discussed': (1.0, 0.0, 0.0),
+}
+
+
+def bucket(at=None):
+    return (at or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def record(post_id, comments=0, likes=0, unlikes=0, at=None):
+    """Add net deltas to the post's bucket for the current hour."""
+    if not (comments or likes or unlikes):
+        return
+
+    hour = bucket(at)
+    rows = PostActivity.objects.filter(post_id=post_id, hour=hour)
+    delta = {
+        'comments': F('comments') + comments,
+        'likes': F('likes') + likes,
+        'unlikes': F('unlikes') + unlikes,
+    }
+
+    if rows.update(**delta):
+        return
+    try:
+        with transaction.atomic():
+            PostActivity.objects.create(
+                post_id=post_id,
+                hour=hour,
+                comments=comments,
+                likes=likes,
+                unlikes=unlikes
+            )
+    except IntegrityError:
+        # another request created the bucket first
+        rows.update(**delta)
+
+
+def set_reaction(post, user, like):
+    """
+    Make the user's reaction a like (or an unlike), replacing the opposite
+    one, and record only what actually changed.
+    """
+    add_to, remove_from = (post.likes, post.unlikes) if like else (post.unlikes, post.likes)
+
+    removed, _ = remove_from.through.objects.filter(post_id=post.pk, user_id=user.pk).delete()
+    added = not add_to.filter(pk=user.pk).exists()
+    if added:
+        add_to.add(user)
+
+    if like:
+        record(post.pk, likes=int(added), unlikes=-removed)
+    else:
+        record(post.pk, likes=-removed, unlikes=int(added))
+
+    if added or removed:
+        invalidate_stats(post.user_id)
+
+
+def clear_reactions(posts):
+    """
+    Remove every like and unlike on `posts` and take them back out of the
+    posts' activity. Returns the ids of the posts that had any.
+    """
+    removed = defaultdict(dict)
+    with transaction.atomic():
+        for kind, reactions in (('likes', Post.likes.through), ('unlikes', Post.unlikes.through)):
+            rows = reactions.objects.filter(post__in=posts)
+            for post_id, count in rows.values('post_id').annotate(n=Count('pk')).values_list('post_id', 'n'):
+                removed[post_id][kind] = -count
+            rows.delete()
+
+        for post_id, deltas in removed.items():
+            record(post_id, **deltas)
+        invalidate_stats(*Post.all_objects.filter(pk__in=removed).values_list('user_id', flat=True))
+    return list(removed)
+
+
+def ranked_post_ids(mode='trending', limit=20, now=None):
+    """
+    Post ids by activity over the last TRENDING_WINDOW_HOURS, each hour
+    weighted down by its age (half-life TRENDING_HALF_LIFE_HOURS).
+    """
+    comments_weight, likes_weight, unlikes_weight = RANKINGS[mode]
+    newest = bucket(now)
+    hours = settings.TRENDING_WINDOW_HOURS
+    half_life = settings.TRENDING_HALF_LIFE_HOURS
+
+    decay = Case(
+        *[
+            When(hour=newest - timedelta(hours=age), then=Value(0.5 ** (age / half_life)))
+            for age in range(hours)
+        ],
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+    activity = (
+        F('comments') * comments_weight
+        + F('likes') * likes_weight
+        + F('unlikes') * unlikes_weight
+    )
+
+    return list(
+        PostActivity.objects
+        .filter(hour__gt=newest - timedelta(hours=hours), post__deleted_at__isnull=True)
+        .values('post_id')
+        .annotate(score=Sum(activity * decay, output_field=FloatField()))
+        .filter(score__gt=0)
+        .order_by('-score', '-post_id')
+        .values_list('post_id', flat=True)[:limit]
+    )
+
+
+def prune(before):
+    """Drop buckets older than `before`. Returns the number of rows removed."""
+    deleted, _ = PostActivity.objects.filter(hour__lt=before).delete()
+    return deleted
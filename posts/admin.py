@@ -1,6 +1,72 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
 from posts.models import Post, Comment
+from SnapBook.paginators import ApproximateCountPaginator
+from posts import activity, media, ranking
+from posts.deletion import soft_delete_comments, soft_delete_posts
 # Register your models here.
 
-admin.site.register(Post)
-admin.site.register(Comment)
\ No newline at end of file
+
+class ModerationAdmin(admin.ModelAdmin):
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    date_hierarchy = 'created_at'
+
+    def get_actions(self, request):
+        # the stock action renders every related like/comment before deleting
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+@admin.register(Post)
+class PostAdmin(ModerationAdmin):
+    list_display = ('id', 'user', 'caption_preview', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('caption',)
+    autocomplete_fields = ('user',)
+    raw_id_fields = ('likes', 'unlikes')
+    actions = ['delete_posts', 'remove_media', 'clear_reactions']
+
+    @admin.display(description='Caption')
+    def caption_preview(self, obj):
+        return (obj.caption or '')[:50]
+
+    @admin.action(description='Delete selected posts', permissions=['delete'])
+    def delete_posts(self, request, queryset):
+        # soft delete, as from the API; purge_deleted_content removes the rows
+        deleted = soft_delete_posts(queryset)
+        self.message_user(request, f"Deleted {deleted} posts.", messages.SUCCESS)
+
+    @admin.action(description='Remove image and video from selected posts', permissions=['change'])
+    def remove_media(self, request, queryset):
+        # drop what was probed from the old video_url along with it
+        updated = queryset.update(image=None, video_url=None, **media.UNINSPECTED)
+        self.message_user(request, f"Removed media from {updated} posts.", messages.SUCCESS)
+
+    @admin.action(description='Clear likes and unlikes on selected posts', permissions=['change'])
+    def clear_reactions(self, request, queryset):
+        with transaction.atomic():
+            post_ids = activity.clear_reactions(queryset)
+            ranking.refresh_scores(post_ids)
+        self.message_user(request, "Reactions cleared.", messages.SUCCESS)
+
+
+@admin.register(Comment)
+class CommentAdmin(ModerationAdmin):
+    list_display = ('id', 'user', 'post', 'text', 'created_at')
+    list_select_related = ('user', 'post__user')
+    search_fields = ('text',)
+    autocomplete_fields = ('user',)
+    raw_id_fields = ('post',)
+    actions = ['delete_comments', 'redact_comments']
+
+    @admin.action(description='Delete selected comments', permissions=['delete'])
+    def delete_comments(self, request, queryset):
+        deleted = soft_delete_comments(queryset)
+        self.message_user(request, f"Deleted {deleted} comments.", messages.SUCCESS)
+
+    @admin.action(description='Redact selected comments', permissions=['change'])
+    def redact_comments(self, request, queryset):
+        updated = queryset.update(text='[removed by moderator]')
+        self.message_user(request, f"Redacted {updated} comments.", messages.SUCCESS)
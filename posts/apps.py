@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        # already imported by the CloudinaryField models at this point
+        import cloudinary
+
+        credentials = settings.CLOUDINARY_STORAGE
+        cloudinary.config(
+            cloud_name=credentials['CLOUD_NAME'],
+            api_key=credentials['API_KEY'],
+            api_secret=credentials['API_SECRET'],
+            secure=True
+        )
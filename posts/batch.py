@@ -0,0 +1,106 @@
+"""
+Batch post creation for imports.
+
+Every item is validated on its own, media for the valid ones is uploaded to
+Cloudinary concurrently through a bounded process-wide pool, and the posts
+are inserted with bulk_create. Failures are reported per item instead of
+failing the batch. Created posts are announced on the realtime feed like
+single ones.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudinary import uploader
+from django.conf import settings
+from django.db import transaction
+
+from posts import media, realtime
+from posts.models import Post
+from posts.ranking import initial_score
+from posts.serializers import PostImportSerializer
+from users.stats import invalidate_stats
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_upload_pool():
+    """Process-wide pool, so concurrent imports share the upload limit."""
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=settings.MEDIA_UPLOAD_WORKERS,
+                    thread_name_prefix='media-upload'
+                )
+    return _pool
+
+
+def upload_image(source):
+    """Upload a file object or remote URL with the Post.image field's options."""
+    field = Post._meta.get_field('image')
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return uploader.upload_resource(source, type=field.type, resource_type=field.resource_type)
+
+
+def create_posts(user, items):
+    """
+    Create posts for `user` from a list of dicts (caption, video_url and
+    optionally image or image_url). Returns one result per item, in order:
+    {'index', 'id'} when created, {'index', 'errors'} otherwise.
+    """
+    results = [None] * len(items)
+    valid = []
+
+    for index, item in enumerate(items):
+        serializer = PostImportSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            results[index] = {'index': index, 'errors': serializer.errors}
+
+    pool = get_upload_pool()
+    uploads = {
+        index: pool.submit(upload_image, data.get('image') or data['image_url'])
+        for index, data in valid
+        if data.get('image') or data.get('image_url')
+    }
+
+    posts = []
+    score = initial_score()
+    for index, data in valid:
+        image = None
+        if index in uploads:
+            try:
+                image = uploads[index].result()
+            except Exception as exc:
+                results[index] = {'index': index, 'errors': {'image': [f"Upload failed: {exc}"]}}
+                continue
+
+        posts.append((index, Post(
+            user=user,
+            caption=data.get('caption'),
+            video_url=data.get('video_url'),
+            image=image,
+            score=score,
+        )))
+
+    with transaction.atomic():
+        Post.objects.bulk_create(
+            [post for _, post in posts],
+            batch_size=settings.BULK_CREATE_BATCH_SIZE
+        )
+        for _, post in posts:
+            realtime.post_created(post)
+
+    if posts:
+        invalidate_stats(user.pk)
+        media.schedule([post.pk for _, post in posts if post.video_url])
+
+    for index, post in posts:
+        results[index] = {'index': index, 'id': post.pk}
+
+    return results
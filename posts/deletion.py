@@ -0,0 +1,184 @@
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from posts import activity, ranking
+from posts.models import Comment, DeletionJob, Payment, Post, PostActivity
+from users.authentication import invalidate_cached_user
+from users.stats import invalidate_stats
+
+User = get_user_model()
+
+PostLike = Post.likes.through
+PostUnlike = Post.unlikes.through
+
+
+def _delete_in_chunks(job, step, queryset, chunk_size=None):
+    """
+    Delete `queryset` a chunk of primary keys at a time, each chunk in its
+    own short transaction, and record progress on the job (if any).
+    Returns the number of rows deleted.
+    """
+    chunk_size = chunk_size or settings.DELETION_CHUNK_SIZE
+    # the base manager also sees soft-deleted rows
+    model_rows = queryset.model._base_manager
+    total = 0
+
+    if job:
+        DeletionJob.objects.filter(pk=job.pk).update(step=step, updated_at=timezone.now())
+
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return total
+
+        with transaction.atomic():
+            deleted, _ = model_rows.filter(pk__in=ids).delete()
+            total += deleted
+            if job:
+                DeletionJob.objects.filter(pk=job.pk).update(
+                    deleted_rows=F('deleted_rows') + deleted,
+                    updated_at=timezone.now()
+                )
+
+
+def _delete_posts(job, posts, chunk_size=None):
+    post_ids = posts.values('pk')
+
+    return sum([
+        _delete_in_chunks(job, 'likes', PostLike.objects.filter(post_id__in=post_ids), chunk_size),
+        _delete_in_chunks(job, 'unlikes', PostUnlike.objects.filter(post_id__in=post_ids), chunk_size),
+        _delete_in_chunks(job, 'comments', Comment.all_objects.filter(post_id__in=post_ids), chunk_size),
+        _delete_in_chunks(job, 'activity', PostActivity.objects.filter(post_id__in=post_ids), chunk_size),
+        _delete_in_chunks(job, 'posts', posts, chunk_size),
+    ])
+
+
+def _delete_user(job):
+    user_id = job.object_id
+
+    # the user's own reactions and comments on other people's posts
+    _delete_in_chunks(job, 'reactions', PostLike.objects.filter(user_id=user_id))
+    _delete_in_chunks(job, 'reactions', PostUnlike.objects.filter(user_id=user_id))
+    _delete_in_chunks(job, 'comments', Comment.all_objects.filter(user_id=user_id))
+
+    _delete_posts(job, Post.all_objects.filter(user_id=user_id))
+    _delete_in_chunks(job, 'payments', Payment.objects.filter(user_id=user_id))
+    _delete_in_chunks(job, 'user', User.objects.filter(pk=user_id))
+
+
+def run_job(job_id):
+    """
+    Claim and run a deletion job. Every step only deletes what is still
+    there, so a job interrupted half-way can simply be run again.
+    """
+    claimed = DeletionJob.objects.filter(
+        pk=job_id,
+        status__in=[DeletionJob.PENDING, DeletionJob.RUNNING]
+    ).update(status=DeletionJob.RUNNING, updated_at=timezone.now())
+    if not claimed:
+        return
+
+    job = DeletionJob.objects.get(pk=job_id)
+    try:
+        _delete_user(job)
+    except Exception as exc:
+        DeletionJob.objects.filter(pk=job_id).update(
+            status=DeletionJob.FAILED,
+            error=str(exc),
+            updated_at=timezone.now()
+        )
+        raise
+
+    DeletionJob.objects.filter(pk=job_id).update(
+        status=DeletionJob.DONE,
+        step='',
+        updated_at=timezone.now()
+    )
+
+
+def _run_in_thread(job_id):
+    def target():
+        close_old_connections()
+        try:
+            run_job(job_id)
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=target, daemon=True).start()
+
+
+def _schedule(kind, object_id, requested_by=None):
+    job = DeletionJob.objects.create(
+        kind=kind,
+        object_id=object_id,
+        requested_by=requested_by
+    )
+    # the process_deletion_jobs command picks up anything the thread misses
+    if settings.DELETION_RUN_IN_THREAD:
+        transaction.on_commit(lambda: _run_in_thread(job.pk))
+    return job
+
+
+def schedule_user_deletion(user, requested_by=None):
+    """Deactivate the user now and remove their data in the background."""
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    invalidate_cached_user(user.pk)
+    return _schedule(DeletionJob.USER, user.pk, requested_by)
+
+
+def soft_delete_posts(posts):
+    """
+    Hide the live posts in `posts` (API and admin deletes); purge_deleted
+    removes them later. Returns the number of posts hidden.
+    """
+    with transaction.atomic():
+        owners = set(posts.values_list('user_id', flat=True))
+        hidden = posts.soft_delete()
+        invalidate_stats(*owners)
+    return hidden
+
+
+def soft_delete_comments(comments):
+    """
+    Hide the live comments in `comments`, take them back out of their posts'
+    activity and scores and drop the post owners' stats. Returns the number
+    of comments hidden.
+    """
+    with transaction.atomic():
+        per_post = dict(
+            comments.order_by().values('post_id').annotate(n=Count('pk')).values_list('post_id', 'n')
+        )
+        hidden = comments.soft_delete()
+        for post_id, count in per_post.items():
+            activity.record(post_id, comments=-count)
+        ranking.refresh_scores(list(per_post))
+        invalidate_stats(*Post.all_objects.filter(pk__in=per_post).values_list('user_id', flat=True))
+    return hidden
+
+
+def purge_deleted(deleted_before, batch_size):
+    """
+    Hard-delete one batch of posts and comments soft-deleted before
+    `deleted_before`. Returns the number of rows removed; 0 means done.
+    """
+    post_ids = list(
+        Post.all_objects.filter(deleted_at__lt=deleted_before)
+        .order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    removed = 0
+    if post_ids:
+        removed += _delete_posts(None, Post.all_objects.filter(pk__in=post_ids), batch_size)
+
+    comment_ids = list(
+        Comment.all_objects.filter(deleted_at__lt=deleted_before)
+        .order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if comment_ids:
+        removed += _delete_in_chunks(None, 'comments', Comment.all_objects.filter(pk__in=comment_ids), batch_size)
+
+    return removed
@@ -0,0 +1,117 @@
+"""
+Streaming data exports.
+
+Rows are read with server-side cursors (or keyset chunks where those are
+disabled, e.g. behind PgBouncer) and written out as they arrive, so memory
+stays flat however large the account is.
+"""
+import csv
+import io
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+from posts.models import Comment, Payment, Post
+
+EXPORTS = {
+    'posts': (Post, ['id', 'caption', 'image', 'video_url', 'created_at', 'updated_at']),
+    'comments': (Comment, ['id', 'post_id', 'text', 'created_at']),
+    'payments': (Payment, ['id', 'order_id', 'transaction_id', 'amount', 'payment_method', 'status', 'created_at']),
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# bytes collected before a chunk is handed to the response
+BUFFER_SIZE = 64 * 1024
+
+
+def iterate(queryset, chunk_size):
+    """Yield rows of a values() queryset in primary key order, a chunk at a time."""
+    queryset = queryset.order_by('pk')
+
+    if not connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        yield from queryset.iterator(chunk_size=chunk_size)
+        return
+
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id)[:chunk_size])
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1]['id']
+
+
+def export_rows(user, types, chunk_size=None):
+    """Yield (type, row) for each of the user's records of the given types."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+
+    for name in types:
+        model, fields = EXPORTS[name]
+        for row in iterate(model.objects.filter(user=user).values(*fields), chunk_size):
+            if name == 'posts':
+                row['image'] = row['image'].url if row['image'] else None
+            yield name, row
+
+
+def ndjson_lines(rows):
+    for name, row in rows:
+        yield json.dumps({'type': name, **row}, cls=DjangoJSONEncoder) + '\n'
+
+
+def csv_lines(rows, types):
+    header = ['type']
+    for name in types:
+        header += [field for field in EXPORTS[name][1] if field not in header]
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=header, restval='')
+    writer.writeheader()
+
+    for name, row in rows:
+        writer.writerow({'type': name, **row})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def encoded(lines, compress=False):
+    """Join lines into ~BUFFER_SIZE byte chunks, gzip-compressing them if asked."""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    pending = []
+    size = 0
+
+    def flush():
+        data = ''.join(pending).encode()
+        pending.clear()
+        return compressor.compress(data) if compressor else data
+
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            size = 0
+            chunk = flush()
+            if chunk:
+                yield chunk
+
+    chunk = flush()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def stream_export(user, types, fmt, compress=False, chunk_size=None):
+    """Byte chunks of the user's export in `fmt` ('ndjson' or 'csv')."""
+    rows = export_rows(user, types, chunk_size)
+    lines = ndjson_lines(rows) if fmt == 'ndjson' else csv_lines(rows, types)
+    return encoded(lines, compress)
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from django.conf import settings
+
+
+class GatewayError(Exception):
+    """Payment gateway could not be reached or returned garbage."""
+
+
+class GatewayUnavailable(GatewayError):
+    """Circuit breaker is open, the gateway is not being called."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and lets a single
+    trial call through once `reset_timeout` seconds have passed.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # half-open: push the window forward so only this call probes
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """
+    Process-wide gateway client, built on first use. The SSLCOMMERZ client
+    (and requests with it) is only imported here, not at startup.
+    """
+    global _gateway
+
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                from posts.sslcommerz import PaymentGateway
+                _gateway = PaymentGateway(settings.SSLCOMMERZ)
+    return _gateway
@@ -0,0 +1,52 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.exports import EXPORTS, FORMATS, stream_export
+
+
+class Command(BaseCommand):
+    help = "Stream a user's posts, comments and payments to a file or stdout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="User id or email.")
+        parser.add_argument("--format", choices=list(FORMATS), default="ndjson")
+        parser.add_argument("--types", default=",".join(EXPORTS),
+                            help="Comma separated subset of posts,comments,payments.")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--output", "-o", default=None,
+                            help="File to write (default: stdout).")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        lookup = {"pk": options["user"]} if options["user"].isdigit() else {"email": options["user"]}
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['user']}")
+
+        types = [name for name in options["types"].split(",") if name]
+        unknown = set(types) - set(EXPORTS)
+        if not types or unknown:
+            raise CommandError(f"Unknown types: {', '.join(sorted(unknown))}")
+
+        chunks = stream_export(
+            user, types, options["format"],
+            compress=options["gzip"],
+            chunk_size=options["chunk_size"]
+        )
+
+        written = 0
+        out = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                out.close()
+
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
@@ -0,0 +1,97 @@
+import json
+from itertools import islice
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.batch import create_posts
+
+
+def read_items(path):
+    """Items from a JSON list or NDJSON file (e.g. an export_user_data file)."""
+    with open(path) as handle:
+        if handle.read(1) == "[":
+            handle.seek(0)
+            yield from json.load(handle)
+            return
+
+        handle.seek(0)
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = "Bulk import posts for a user from a JSON or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="User id or email that will own the posts.")
+        parser.add_argument("file", help="JSON list or NDJSON of {caption, video_url, image}.")
+        parser.add_argument("--media-dir", default=".",
+                            help="Directory that relative image paths are resolved against.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def get_item(self, raw, media_dir, opened):
+        item = {key: raw.get(key) for key in ("caption", "video_url") if raw.get(key)}
+        image = raw.get("image_url") or raw.get("image")
+
+        if image and image.startswith(("http://", "https://")):
+            item["image_url"] = image
+        elif image:
+            path = media_dir / image
+            handle = open(path, "rb")
+            opened.append(handle)
+            item["image"] = File(handle, name=path.name)
+        return item
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        lookup = {"pk": options["user"]} if options["user"].isdigit() else {"email": options["user"]}
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['user']}")
+
+        media_dir = Path(options["media_dir"])
+        # export files mix posts with comments and payments
+        items = (
+            raw for raw in read_items(options["file"])
+            if raw.get("type", "posts") == "posts"
+        )
+
+        offset = created = failed = 0
+        while True:
+            batch = list(islice(items, options["batch_size"]))
+            if not batch:
+                break
+
+            opened = []
+            prepared, positions = [], []
+            try:
+                for position, raw in enumerate(batch):
+                    try:
+                        prepared.append(self.get_item(raw, media_dir, opened))
+                    except OSError as exc:
+                        failed += 1
+                        self.stderr.write(f"Item {offset + position}: {exc}")
+                        continue
+                    positions.append(position)
+                results = create_posts(user, prepared) if prepared else []
+            finally:
+                for handle in opened:
+                    handle.close()
+
+            for result in results:
+                if "id" in result:
+                    created += 1
+                else:
+                    failed += 1
+                    position = positions[result["index"]]
+                    self.stderr.write(f"Item {offset + position}: {json.dumps(result['errors'])}")
+
+            offset += len(batch)
+            self.stdout.write(f"{offset} items processed")
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} posts, {failed} failed"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts.media import UNINSPECTED, inspect_posts, pending
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Fetch metadata for video URLs that have not been inspected yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Inspect again the URLs that failed last time.")
+
+    def handle(self, *args, **options):
+        if options["retry_failed"]:
+            Post.objects.filter(video_status=Post.VIDEO_FAILED).update(**UNINSPECTED)
+
+        queryset = pending().order_by("pk")
+        last_id = 0
+        inspected = 0
+
+        while True:
+            ids = list(queryset.filter(pk__gt=last_id).values_list("pk", flat=True)[:options["batch_size"]])
+            if not ids:
+                break
+
+            inspected += inspect_posts(Post.objects.filter(pk__in=ids))
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Inspected {inspected} video URLs"))
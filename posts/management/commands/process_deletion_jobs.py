@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from posts.deletion import run_job
+from posts.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = "Run pending deletion jobs and resume ones that stopped making progress."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stale-after", type=int, default=10,
+                            help="Minutes without progress before a running job is resumed.")
+
+    def handle(self, *args, **options):
+        stale = timezone.now() - timedelta(minutes=options["stale_after"])
+        job_ids = DeletionJob.objects.filter(
+            Q(status=DeletionJob.PENDING) |
+            Q(status=DeletionJob.RUNNING, updated_at__lt=stale)
+        ).order_by("id").values_list("id", flat=True)
+
+        done = 0
+        for job_id in job_ids:
+            try:
+                run_job(job_id)
+            except Exception as exc:
+                self.stderr.write(f"Deletion job {job_id} failed: {exc}")
+                continue
+            done += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {done} deletion jobs"))
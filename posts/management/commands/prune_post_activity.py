@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.activity import prune
+
+
+class Command(BaseCommand):
+    help = "Remove hourly post activity buckets that no ranking looks at any more."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-days", type=int, default=7)
+
+    def handle(self, *args, **options):
+        removed = prune(timezone.now() - timedelta(days=options["keep_days"]))
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} activity buckets"))
@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.deletion import purge_deleted
+
+
+class Command(BaseCommand):
+    help = "Hard-delete soft-deleted posts and comments in small batches (run off-peak)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=24,
+                            help="Only purge rows soft-deleted at least this many hours ago.")
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--pause", type=float, default=0.5,
+                            help="Seconds to sleep between batches.")
+        parser.add_argument("--max-batches", type=int, default=None)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options["older_than"])
+        batches = removed = 0
+
+        while options["max_batches"] is None or batches < options["max_batches"]:
+            count = purge_deleted(cutoff, options["batch_size"])
+            if not count:
+                break
+
+            removed += count
+            batches += 1
+            time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {removed} rows in {batches} batches"
+        ))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute PaymentDailyRollup rows from the Payment table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=2,
+                            help="Rebuild this many most recent days.")
+        parser.add_argument("--all", action="store_true",
+                            help="Rebuild every day (full backfill).")
+
+    def handle(self, *args, **options):
+        start = None
+        if not options["all"]:
+            start = timezone.localdate() - timedelta(days=options["days"] - 1)
+
+        rollups.rebuild(start=start)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt payment rollups from {start or 'the beginning'}"
+        ))
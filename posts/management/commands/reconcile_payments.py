@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.gateway import GatewayError, GatewayUnavailable, get_gateway
+from posts.models import Payment
+from posts.payments import bulk_apply_statuses, status_from_gateway
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+class Command(BaseCommand):
+    help = "Resolve payments stuck in pending by querying the payment gateway."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=30,
+                            help="Only check payments pending for at least this many minutes.")
+        parser.add_argument("--chunk-size", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=4,
+                            help="Concurrent gateway requests.")
+        parser.add_argument("--rate", type=float, default=5,
+                            help="Max gateway requests per second (0 = unlimited).")
+        parser.add_argument("--after-id", type=int, default=None,
+                            help="Resume after this payment id.")
+        parser.add_argument("--checkpoint-file", default=None,
+                            help="Resume from and record progress in this file; removed after a full sweep.")
+
+    def handle(self, *args, **options):
+        checkpoint = Path(options["checkpoint_file"]) if options["checkpoint_file"] else None
+
+        last_id = options["after_id"]
+        if last_id is None and checkpoint and checkpoint.exists():
+            last_id = int(checkpoint.read_text().strip() or 0)
+        last_id = last_id or 0
+
+        cutoff = timezone.now() - timedelta(minutes=options["older_than"])
+        limiter = RateLimiter(options["rate"])
+        gateway = get_gateway()
+
+        def query(payment):
+            limiter.wait()
+            try:
+                response = gateway.transaction_query_tranid(f"txn_{payment.order_id}")
+            except GatewayUnavailable:
+                raise
+            except GatewayError:
+                return payment.id, None, True
+            return payment.id, status_from_gateway(response), False
+
+        checked = updated = errors = 0
+        finished = False
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            while True:
+                chunk = list(
+                    Payment.objects.filter(
+                        status=Payment.PENDING,
+                        created_at__lt=cutoff,
+                        id__gt=last_id,
+                    )
+                    .order_by("id")
+                    .only("id", "order_id")[:options["chunk_size"]]
+                )
+                if not chunk:
+                    finished = True
+                    break
+
+                try:
+                    results = list(pool.map(query, chunk))
+                except GatewayUnavailable:
+                    self.stderr.write(
+                        f"Gateway circuit open, stopping. Resume with --after-id {last_id}"
+                    )
+                    break
+
+                updates = {}
+                for payment_id, new_status, failed in results:
+                    errors += failed
+                    if new_status:
+                        updates[payment_id] = new_status
+
+                updated += bulk_apply_statuses(updates)
+                checked += len(chunk)
+                last_id = chunk[-1].id
+
+                if checkpoint:
+                    checkpoint.write_text(str(last_id))
+
+        # a complete sweep starts from the beginning next time
+        if finished and checkpoint and checkpoint.exists():
+            checkpoint.unlink()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} payments, updated {updated}, "
+            f"{errors} gateway errors, last id {last_id}"
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.ranking import aging_posts, refresh_scores
+
+
+class Command(BaseCommand):
+    help = "Recompute top-feed scores of posts young enough for recency to matter (run every few minutes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        # one clock for the whole run keeps scores comparable
+        now = timezone.now()
+        queryset = aging_posts(now).order_by("pk").values_list("pk", flat=True)
+        last_id = 0
+        refreshed = 0
+
+        while True:
+            ids = list(queryset.filter(pk__gt=last_id)[:options["chunk_size"]])
+            if not ids:
+                break
+
+            refreshed += refresh_scores(ids, now)
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} post scores"))
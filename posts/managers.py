@@ -0,0 +1,15 @@
+from django.db import models
+from django.utils import timezone
+
+
+class LiveQuerySet(models.QuerySet):
+
+    def soft_delete(self):
+        return self.update(deleted_at=timezone.now())
+
+
+class LiveManager(models.Manager.from_queryset(LiveQuerySet)):
+    """Default manager: hides soft-deleted rows."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
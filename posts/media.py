@@ -0,0 +1,259 @@
+"""
+Background inspection of Post.video_url.
+
+New or changed video URLs are probed by a queued task (api/taskqueue.py),
+and `manage.py inspect_media` picks up anything left over. Each batch runs
+on an asyncio loop that keeps at most MEDIA_INSPECT['CONCURRENCY'] requests
+in flight through one pooled requests session, with connect/read timeouts
+per request and an overall deadline per URL.
+
+Known embed hosts are asked through oEmbed (thumbnail, and duration where
+the provider reports it); anything else gets a HEAD for content type and
+size, and MP4/QuickTime files a ranged GET of the first bytes to read the
+duration from the movie header when it sits at the front of the file.
+
+Video URLs come from users, so only http(s) is fetched, every host (each
+redirect included) must resolve to public addresses, and redirects are
+followed by hand up to MEDIA_INSPECT['MAX_REDIRECTS'].
+"""
+import asyncio
+import ipaddress
+import logging
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from api.taskqueue import task
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+OEMBED_PROVIDERS = {
+    'youtube.com': 'https://www.youtube.com/oembed',
+    'youtu.be': 'https://www.youtube.com/oembed',
+    'vimeo.com': 'https://vimeo.com/api/oembed.json',
+}
+MP4_TYPES = {'video/mp4', 'video/quicktime', 'video/x-m4v'}
+
+# saved with a new video_url so the post is inspected again
+UNINSPECTED = {
+    'video_status': '',
+    'video_content_type': '',
+    'video_size': None,
+    'video_duration': None,
+    'video_thumbnail': None,
+}
+
+
+class MediaError(Exception):
+    pass
+
+
+def schedule(post_ids):
+    """Queue inspection of these posts; it runs once the transaction commits."""
+    post_ids = [pk for pk in post_ids if pk]
+    if post_ids:
+        inspect_media.delay(post_ids)
+
+
+@task
+def inspect_media(post_ids):
+    inspect_posts(Post.objects.filter(pk__in=post_ids))
+
+
+def pending():
+    return Post.objects.filter(video_status='', video_url__gt='')
+
+
+def inspect_posts(queryset=None):
+    """
+    Inspect the pending posts in `queryset` (all pending posts by default)
+    and store the results. Returns the number of posts updated.
+    """
+    queryset = pending() if queryset is None else queryset.filter(video_status='', video_url__gt='')
+    targets = list(queryset.values_list('pk', 'video_url'))
+    if not targets:
+        return 0
+
+    results = asyncio.run(_inspect_all([url for _, url in targets]))
+
+    now = timezone.now()
+    updated = 0
+    for (pk, url), fields in zip(targets, results):
+        # skip posts whose video_url changed while we were probing
+        updated += Post.objects.filter(pk=pk, video_url=url).update(**fields, video_checked_at=now)
+    return updated
+
+
+async def _inspect_all(urls):
+    options = settings.MEDIA_INSPECT
+    concurrency = options['CONCURRENCY']
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_maxsize=concurrency))
+    session.mount('http://', HTTPAdapter(pool_maxsize=concurrency))
+    session.headers['User-Agent'] = 'SnapBook media inspector'
+
+    async def one(url):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(executor, inspect_url, session, url),
+                    options['DEADLINE']
+                )
+            except (requests.RequestException, MediaError, asyncio.TimeoutError) as exc:
+                logger.info("Media inspection of %s failed: %r", url, exc)
+                return {**UNINSPECTED, 'video_status': Post.VIDEO_FAILED}
+
+    with session, ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='media-fetch') as executor:
+        return await asyncio.gather(*(one(url) for url in urls))
+
+
+def inspect_url(session, url):
+    """Metadata fields for one video URL; raises on unreachable media."""
+    host = (urlsplit(url).hostname or '').removeprefix('www.').removeprefix('m.')
+    if host in OEMBED_PROVIDERS:
+        return _inspect_oembed(session, OEMBED_PROVIDERS[host], url)
+    return _inspect_file(session, url)
+
+
+def _timeout():
+    options = settings.MEDIA_INSPECT
+    return options['CONNECT_TIMEOUT'], options['READ_TIMEOUT']
+
+
+def check_url(url):
+    """Raise MediaError unless `url` is http(s) on a host with only public addresses."""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise MediaError(f"Unsupported media URL {url!r}")
+    if parts.hostname in settings.MEDIA_INSPECT['ALLOWED_PRIVATE_HOSTS']:
+        return
+
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, ValueError) as exc:
+        raise MediaError(f"Cannot resolve {parts.hostname}: {exc}")
+
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise MediaError(f"{parts.hostname} resolves to non-public address {address}")
+
+
+def _request(session, method, url, **kwargs):
+    """Send a request, following redirects only to hosts check_url accepts."""
+    for _ in range(settings.MEDIA_INSPECT['MAX_REDIRECTS'] + 1):
+        check_url(url)
+        response = session.request(method, url, allow_redirects=False, timeout=_timeout(), **kwargs)
+        if not response.is_redirect:
+            return response
+        response.close()
+        url = urljoin(url, response.headers['Location'])
+        if response.status_code == 303 and method != 'HEAD':
+            method = 'GET'
+    raise MediaError("Too many redirects")
+
+
+def _inspect_oembed(session, endpoint, url):
+    response = _request(session, 'GET', endpoint, params={'url': url, 'format': 'json'})
+    if response.status_code != 200:
+        raise MediaError(f"oEmbed returned {response.status_code}")
+    try:
+        data = response.json()
+    except ValueError:
+        raise MediaError("oEmbed returned invalid JSON")
+
+    return {
+        **UNINSPECTED,
+        'video_status': Post.VIDEO_READY,
+        'video_content_type': 'text/html',
+        'video_duration': data.get('duration'),
+        'video_thumbnail': data.get('thumbnail_url'),
+    }
+
+
+def _inspect_file(session, url):
+    response = _request(session, 'HEAD', url)
+    if response.status_code in (403, 405, 501):
+        # some hosts refuse HEAD; a one-byte range says the same
+        response = _request(session, 'GET', url, headers={'Range': 'bytes=0-0'}, stream=True)
+        response.close()
+    if response.status_code >= 400:
+        raise MediaError(f"Media URL returned {response.status_code}")
+
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    fields = {
+        **UNINSPECTED,
+        'video_status': Post.VIDEO_READY,
+        'video_content_type': content_type[:100],
+        'video_size': _content_size(response),
+    }
+    if content_type in MP4_TYPES:
+        fields['video_duration'] = _probe_mp4_duration(session, response.url)
+    return fields
+
+
+def _content_size(response):
+    total = response.headers.get('Content-Range', '').rpartition('/')[2]
+    size = total if total.isdigit() else response.headers.get('Content-Length', '')
+    return int(size) if size.isdigit() else None
+
+
+def _probe_mp4_duration(session, url):
+    limit = settings.MEDIA_INSPECT['PROBE_BYTES']
+    response = _request(session, 'GET', url, headers={'Range': f'bytes=0-{limit - 1}'}, stream=True)
+    with response:
+        if response.status_code not in (200, 206):
+            return None
+        data = response.raw.read(limit, decode_content=True)
+    return mp4_duration(data)
+
+
+def mp4_duration(data):
+    """Seconds from the mvhd box in `data`, or None when it is not there."""
+    mvhd = _find_box(data, (b'moov', b'mvhd'))
+    if mvhd is None or len(mvhd) < 20:
+        return None
+
+    if mvhd[0] == 1:
+        if len(mvhd) < 32:
+            return None
+        timescale, duration = struct.unpack_from('>IQ', mvhd, 20)
+    else:
+        timescale, duration = struct.unpack_from('>II', mvhd, 12)
+    return round(duration / timescale, 3) if timescale else None
+
+
+def _find_box(data, path):
+    """Payload of the box at `path` (e.g. moov/mvhd) inside `data`."""
+    offset = 0
+    while offset + 8 <= len(data):
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > len(data):
+                return None
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header:
+            return None
+
+        if kind == path[0]:
+            payload = data[offset + header:offset + size]
+            return payload if len(path) == 1 else _find_box(payload, path[1:])
+        offset += size
+    return None
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-19 19:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('comments', models.IntegerField(default=0)),
+                ('likes', models.IntegerField(default=0)),
+                ('unlikes', models.IntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='post_activity_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'hour'), name='post_activity_bucket_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_video_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deletionjob',
+            name='kind',
+            field=models.CharField(choices=[('user', 'User')], max_length=10),
+        ),
+    ]
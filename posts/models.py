@@ -1,9 +1,19 @@
 from django.db import models
 from cloudinary.models import CloudinaryField
 from django.contrib.auth import get_user_model
+from .managers import LiveManager
 User = get_user_model()
 
 class Post(models.Model):
+
+    VIDEO_READY = 'ready'
+    VIDEO_FAILED = 'failed'
+    VIDEO_STATUS_CHOICES = [
+        ('', 'Not inspected'),
+        (VIDEO_READY, 'Ready'),
+        (VIDEO_FAILED, 'Failed'),
+    ]
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -24,9 +34,50 @@ class Post(models.Model):
         related_name='unliked_posts',
         blank=True
     )
+    # set by user-facing deletes; purge_deleted_content removes the row later
+    deleted_at = models.DateTimeField(blank=True, null=True)
+    # "top" feed rank, maintained by posts/ranking.py
+    score = models.FloatField(default=0)
+    # video_url metadata, filled in the background by posts/media.py
+    video_status = models.CharField(max_length=10, choices=VIDEO_STATUS_CHOICES, blank=True, default='')
+    video_content_type = models.CharField(max_length=100, blank=True, default='')
+    video_size = models.BigIntegerField(blank=True, null=True)
+    video_duration = models.FloatField(blank=True, null=True)
+    video_thumbnail = models.URLField(max_length=500, blank=True, null=True)
+    video_checked_at = models.DateTimeField(blank=True, null=True)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='post_created_at_idx'),
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='post_live_created_idx'
+            ),
+            models.Index(
+                fields=['-score', '-id'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='post_live_score_idx'
+            ),
+            # public author pages: one author's live posts, newest first
+            models.Index(
+                fields=['user', '-created_at', '-id'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='post_live_author_idx'
+            ),
+            # posts still waiting for media inspection
+            models.Index(
+                fields=['id'],
+                condition=models.Q(video_status='', video_url__gt=''),
+                name='post_video_pending_idx'
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.user.email} - {self.caption[:20]}"
+        return f"{self.user.email} - {(self.caption or '')[:20]}"
     
 
 
@@ -43,6 +94,20 @@ class Comment(models.Model):
     )
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    deleted_at = models.DateTimeField(blank=True, null=True)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='comment_created_at_idx'),
+            models.Index(
+                fields=['post', 'created_at'],
+                condition=models.Q(deleted_at__isnull=True),
+                name='comment_live_post_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -53,6 +118,17 @@ class Comment(models.Model):
 
 class Payment(models.Model):
 
+    PENDING = "pending"
+    VERIFIED = "verified"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (VERIFIED, 'Verified'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
     order_id = models.CharField(max_length=100, unique=True)
@@ -63,9 +139,130 @@ class Payment(models.Model):
 
     payment_method = models.CharField(max_length=50)
 
-    status = models.CharField(max_length=20, default="pending")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # keyset scans over pending payments (reconcile_payments)
+            models.Index(fields=['status', 'id'], name='payment_status_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.order_id}"
+
+
 
+class PaymentEvent(models.Model):
+    """Append-only log of every gateway callback, duplicates included."""
+
+    SUCCESS = "success"
+    FAIL = "fail"
+    CANCEL = "cancel"
+    EVENT_CHOICES = [
+        (SUCCESS, 'Success'),
+        (FAIL, 'Fail'),
+        (CANCEL, 'Cancel'),
+    ]
+
+    order_id = models.CharField(max_length=100, db_index=True)
+    tran_id = models.CharField(max_length=150, blank=True)
+    event = models.CharField(max_length=20, choices=EVENT_CHOICES)
+    # False when the payment had already left "pending" (gateway retry)
+    # or the gateway did not confirm the callback
+    applied = models.BooleanField(default=False)
+    payload = models.JSONField(default=dict)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.user} - {self.order_id}"
\ No newline at end of file
+        return f"{self.order_id} - {self.event}"
+
+
+
+class PaymentDailyRollup(models.Model):
+    """Per-day payment totals, kept current on every payment state change."""
+
+    day = models.DateField()
+    payment_method = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=20, choices=Payment.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'payment_method', 'status'],
+                name='payment_rollup_bucket_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.payment_method} - {self.status}"
+
+
+
+class DeletionJob(models.Model):
+    """Background removal of a user and everything hanging off it."""
+
+    USER = "user"
+    KIND_CHOICES = [
+        (USER, 'User'),
+    ]
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    step = models.CharField(max_length=50, blank=True)
+    deleted_rows = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='deletion_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} - {self.status}"
+
+
+
+class PostActivity(models.Model):
+    """Net comments and reactions per post per hour, kept current on every write."""
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='activity')
+    hour = models.DateTimeField()
+    comments = models.IntegerField(default=0)
+    likes = models.IntegerField(default=0)
+    unlikes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'hour'], name='post_activity_bucket_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='post_activity_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} - {self.hour}"
@@ -1,5 +1,107 @@
-from rest_framework.pagination import PageNumberPagination
+import abc
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
-    page_size = 10
\ No newline at end of file
+    page_size = 10
+
+
+class KeysetPagination(BasePagination, metaclass=abc.ABCMeta):
+    """
+    Keyset pagination over (<ordering_field> DESC, id DESC). The cursor is
+    the last row's (value, id), so every page is one range scan of the
+    matching index however deep the client pages.
+    """
+
+    page_size = 20
+    cursor_query_param = 'cursor'
+    ordering_field = None
+
+    def encode_value(self, value):
+        return repr(value)
+
+    @abc.abstractmethod
+    def decode_value(self, raw):
+        """The ordering value from its encode_value() form; None if invalid."""
+
+    def encode_cursor(self, obj):
+        raw = f"{self.encode_value(getattr(obj, self.ordering_field))}|{obj.pk}".encode()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            value, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            value = self.decode_value(value)
+            if value is None:
+                raise ValueError
+            return value, int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        position = self.decode_cursor(request)
+
+        field = self.ordering_field
+        queryset = queryset.order_by(f'-{field}', '-id')
+        if position:
+            value, pk = position
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ScoreKeysetPagination(KeysetPagination):
+    """Pages of the "top" feed, one range scan of post_live_score_idx each."""
+
+    ordering_field = 'score'
+
+    def decode_value(self, raw):
+        return float(raw)
+
+
+class CreatedKeysetPagination(KeysetPagination):
+    """Newest-first pages, e.g. one author's posts over post_live_author_idx."""
+
+    ordering_field = 'created_at'
+
+    def encode_value(self, value):
+        return value.isoformat()
+
+    def decode_value(self, raw):
+        return parse_datetime(raw)
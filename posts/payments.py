@@ -0,0 +1,172 @@
+from django.db import transaction
+
+from api.taskqueue import Retry, task
+from posts.gateway import GatewayError, get_gateway
+from posts.models import Payment, PaymentEvent
+from posts import rollups
+from users.stats import invalidate_stats
+
+
+CALLBACK_STATUS = {
+    PaymentEvent.SUCCESS: Payment.VERIFIED,
+    PaymentEvent.FAIL: Payment.FAILED,
+    PaymentEvent.CANCEL: Payment.CANCELLED,
+}
+
+
+def order_id_from_tran_id(tran_id):
+    return tran_id.replace("txn_", "")
+
+
+def confirmed_transaction(event, tran_id):
+    """
+    The gateway's record of `tran_id` when it confirms the callback `event`,
+    or None: the gateway has no such transaction, reports another outcome,
+    or could not be reached. Callbacks are unauthenticated, so nothing from
+    the POST body but the transaction id is trusted.
+    """
+    try:
+        response = get_gateway().transaction_query_tranid(tran_id)
+    except GatewayError:
+        return None
+
+    # an empty answer settles a payment for reconciliation, never for a callback
+    if status_from_gateway(response) != CALLBACK_STATUS[event]:
+        return None
+    for element in response["element"]:
+        if GATEWAY_STATUS.get(element.get("status")) == CALLBACK_STATUS[event]:
+            return element
+    return None
+
+
+def process_callback(event, data):
+    """
+    Apply a gateway callback to its payment exactly once.
+
+    The outcome, amount and card type are taken from the gateway's own
+    record of the transaction; a callback the gateway does not confirm is
+    logged but left for reconcile_payment. The transition is a single
+    conditional UPDATE on pending rows, so a retried or concurrent callback
+    matches nothing and writes nothing to Payment. Every callback is still
+    recorded in PaymentEvent, and applied transitions are folded into the
+    daily rollups.
+    Returns True if this callback moved the payment out of pending.
+    """
+    tran_id = data.get("tran_id") or ""
+    order_id = order_id_from_tran_id(tran_id)
+
+    # queried before the transaction, so no row is locked across the request
+    element = confirmed_transaction(event, tran_id) if tran_id else None
+
+    fields = {"status": CALLBACK_STATUS[event], "transaction_id": tran_id}
+    if element is not None and event == PaymentEvent.SUCCESS:
+        if element.get("amount"):
+            fields["amount"] = element["amount"]
+        fields["payment_method"] = element.get("card_type") or ""
+
+    with transaction.atomic():
+        applied = False
+        if element is not None:
+            pending = Payment.objects.filter(order_id=order_id, status=Payment.PENDING)
+            before = pending.values("created_at", "payment_method", "status", "amount", "user_id").first()
+            applied = before is not None and pending.update(**fields) == 1
+
+        if applied:
+            rollups.record_transitions([(before, {**before, **fields})])
+            if fields["status"] == Payment.VERIFIED:
+                invalidate_stats(before["user_id"])
+
+        PaymentEvent.objects.create(
+            order_id=order_id,
+            tran_id=tran_id,
+            event=event,
+            applied=applied,
+            payload=data,
+        )
+
+    return applied
+
+
+# SSLCOMMERZ transaction statuses -> Payment.status
+GATEWAY_STATUS = {
+    "VALID": Payment.VERIFIED,
+    "VALIDATED": Payment.VERIFIED,
+    "FAILED": Payment.FAILED,
+    "INVALID_TRANSACTION": Payment.FAILED,
+    "CANCELLED": Payment.CANCELLED,
+    "EXPIRED": Payment.CANCELLED,
+    "UNATTEMPTED": Payment.CANCELLED,
+}
+
+
+def status_from_gateway(response):
+    """
+    Map a transaction query response to a final Payment status, or None
+    when it does not settle the payment: the gateway still considers the
+    transaction open, or the query itself failed (INVALID_REQUEST,
+    INACTIVE, bad store credentials, ...).
+    """
+    if not isinstance(response, dict) or response.get("APIConnect") != "DONE":
+        return None
+
+    elements = response.get("element") or []
+    if not elements:
+        # a successful query found nothing: the customer never reached the gateway
+        return Payment.FAILED
+
+    statuses = [GATEWAY_STATUS.get(element.get("status")) for element in elements]
+    if Payment.VERIFIED in statuses:
+        return Payment.VERIFIED
+    if None in statuses:
+        return None
+    return statuses[0]
+
+
+def bulk_apply_statuses(updates):
+    """
+    Apply {payment_id: status} to payments that are still pending.
+
+    Rows are re-read under a row lock so a callback that landed while the
+    gateway was being queried is not overwritten. Returns the number of
+    payments updated.
+    """
+    if not updates:
+        return 0
+
+    with transaction.atomic():
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(id__in=updates.keys(), status=Payment.PENDING)
+            .only("id", "status", "payment_method", "amount", "created_at", "user_id")
+        )
+        transitions = []
+        for payment in payments:
+            before = {
+                "created_at": payment.created_at,
+                "payment_method": payment.payment_method,
+                "status": payment.status,
+                "amount": payment.amount,
+            }
+            payment.status = updates[payment.id]
+            transitions.append((before, {**before, "status": payment.status}))
+
+        Payment.objects.bulk_update(payments, ["status"])
+        rollups.record_transitions(transitions)
+        invalidate_stats(*(payment.user_id for payment in payments if payment.status == Payment.VERIFIED))
+
+    return len(payments)
+
+
+@task(max_attempts=8)
+def reconcile_payment(payment_id):
+    """Settle a payment still pending long after checkout from the gateway's record."""
+    payment = Payment.objects.filter(pk=payment_id, status=Payment.PENDING).only("id", "order_id").first()
+    if payment is None:
+        return
+
+    # gateway errors propagate, so the task is retried with backoff
+    response = get_gateway().transaction_query_tranid(f"txn_{payment.order_id}")
+    new_status = status_from_gateway(response)
+    if new_status is None:
+        raise Retry("transaction still open at the gateway")
+    bulk_apply_statuses({payment.pk: new_status})
@@ -0,0 +1,91 @@
+"""
+Precomputed "top" feed scores.
+
+score = (likes - unlikes + RANKING_COMMENT_WEIGHT * recent comments + 1)
+        / (age in hours + 2) ** RANKING_GRAVITY
+
+Scores are refreshed for single posts whenever their reactions or comments
+change, and for every aging post by `manage.py refresh_post_scores`, since
+the recency part keeps moving. Past RANKING_MAX_AGE_DAYS a post's score is
+pinned to 0, which also takes it out of future refresh runs.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from posts.models import Post, PostActivity
+
+PostLike = Post.likes.through
+PostUnlike = Post.unlikes.through
+
+
+def compute_score(net_reactions, recent_comments, created_at, now):
+    age_hours = (now - created_at).total_seconds() / 3600
+    if age_hours > settings.RANKING_MAX_AGE_DAYS * 24:
+        return 0.0
+
+    engagement = net_reactions + settings.RANKING_COMMENT_WEIGHT * recent_comments + 1
+    return engagement / (max(age_hours, 0) + 2) ** settings.RANKING_GRAVITY
+
+
+def initial_score():
+    now = timezone.now()
+    return compute_score(0, 0, now, now)
+
+
+def _counts(queryset, post_ids):
+    return dict(
+        queryset.filter(post_id__in=post_ids)
+        .values('post_id')
+        .annotate(n=Count('id'))
+        .values_list('post_id', 'n')
+    )
+
+
+def refresh_scores(post_ids, now=None):
+    """
+    Recompute the scores of `post_ids` with one grouped query per signal
+    and a single bulk update. Returns the number of posts updated.
+    """
+    now = now or timezone.now()
+    posts = list(Post.all_objects.filter(pk__in=post_ids).only('id', 'created_at', 'score'))
+    if not posts:
+        return 0
+
+    ids = [post.pk for post in posts]
+    likes = _counts(PostLike.objects, ids)
+    unlikes = _counts(PostUnlike.objects, ids)
+    comments = dict(
+        PostActivity.objects
+        .filter(post_id__in=ids, hour__gte=now - timedelta(hours=settings.RANKING_COMMENT_HOURS))
+        .values('post_id')
+        .annotate(n=Sum('comments'))
+        .values_list('post_id', 'n')
+    )
+
+    for post in posts:
+        post.score = compute_score(
+            likes.get(post.pk, 0) - unlikes.get(post.pk, 0),
+            comments.get(post.pk, 0),
+            post.created_at,
+            now
+        )
+
+    Post.all_objects.bulk_update(posts, ['score'])
+    return len(posts)
+
+
+def refresh_post(post_id):
+    refresh_scores([post_id])
+
+
+def aging_posts(now=None):
+    """Posts whose score still changes with time."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.RANKING_MAX_AGE_DAYS)
+
+    return Post.objects.filter(
+        Q(created_at__gte=cutoff) | Q(score__gt=0) | Q(score__lt=0)
+    )
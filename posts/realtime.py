@@ -0,0 +1,202 @@
+"""
+Live activity over Server-Sent Events.
+
+Write paths publish small events after commit: `post_created` on the feed
+channel, `counters` (likes/unlikes) and `comment_created` on the post's own
+channel. Clients subscribe to the feed and/or a set of posts; each stream
+coalesces counter updates so a busy post sends at most one per post every
+REALTIME_COALESCE_SECONDS.
+
+The broker is pluggable (REALTIME_BROKER): the in-process default only
+reaches clients connected to the same process, RedisBroker fans out across
+nodes. Streams need the ASGI entry point (SnapBook/asgi.py).
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+FEED = 'feed'
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+class Subscription:
+    """A bounded per-client queue, fed from any thread."""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.REALTIME_QUEUE_SIZE)
+
+    def deliver(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        # a slow client loses its oldest events rather than growing the queue
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    async def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].discard(subscription)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisSubscription:
+
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def get(self, timeout):
+        message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+        return json.loads(message['data']) if message else None
+
+    async def close(self):
+        await self.pubsub.aclose()
+
+
+class RedisBroker:
+    """Redis pub/sub, for running more than one process. Needs the redis package."""
+
+    prefix = 'snapbook:'
+
+    def __init__(self):
+        import redis
+        import redis.asyncio
+
+        self.client = redis.Redis.from_url(settings.REDIS_URL)
+        self.async_client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, json.dumps(message, cls=DjangoJSONEncoder))
+
+    async def subscribe(self, channels):
+        pubsub = self.async_client.pubsub()
+        await pubsub.subscribe(*(self.prefix + channel for channel in channels))
+        return RedisSubscription(pubsub)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.REALTIME_BROKER)()
+    return _broker
+
+
+def publish(channel, event, **data):
+    """Publish once the current transaction commits; never fails the write."""
+    message = {'event': event, **data}
+
+    def send():
+        try:
+            get_broker().publish(channel, message)
+        except Exception:
+            logger.exception("Could not publish %s event", event)
+
+    transaction.on_commit(send)
+
+
+def post_created(post):
+    publish(FEED, 'post_created', post_id=post.pk, user_id=post.user_id, created_at=post.created_at)
+
+
+def counters_changed(post_id, total_likes, total_unlikes):
+    publish(post_channel(post_id), 'counters', post_id=post_id,
+            total_likes=total_likes, total_unlikes=total_unlikes)
+
+
+def comment_created(comment):
+    # post_id may still be the raw URL kwarg
+    post_id = int(comment.post_id)
+    publish(post_channel(post_id), 'comment_created', post_id=post_id,
+            comment_id=comment.pk, user_id=comment.user_id, text=comment.text,
+            created_at=comment.created_at)
+
+
+def format_event(message):
+    data = json.dumps(message, cls=DjangoJSONEncoder)
+    return f"event: {message['event']}\ndata: {data}\n\n"
+
+
+async def event_stream(channels):
+    """SSE lines for one client, with coalesced counters and heartbeats."""
+    subscription = await get_broker().subscribe(channels)
+    loop = asyncio.get_running_loop()
+    coalesce = settings.REALTIME_COALESCE_SECONDS
+    heartbeat = settings.REALTIME_HEARTBEAT_SECONDS
+    pending = {}
+    flush_at = None
+
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            timeout = flush_at - loop.time() if flush_at else heartbeat
+            message = await subscription.get(max(timeout, 0))
+
+            if message and message['event'] == 'counters':
+                # only the latest counts per post are worth sending
+                pending[message['post_id']] = message
+                flush_at = flush_at or loop.time() + coalesce
+            elif message:
+                yield format_event(message)
+
+            if flush_at and loop.time() >= flush_at:
+                for counters in pending.values():
+                    yield format_event(counters)
+                pending.clear()
+                flush_at = None
+            elif message is None and not flush_at:
+                yield ": ping\n\n"
+    finally:
+        await subscription.close()
@@ -0,0 +1,104 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from posts.models import Payment, PaymentDailyRollup
+
+
+def _bump(day, payment_method, status, count, amount):
+    bucket = PaymentDailyRollup.objects.filter(
+        day=day,
+        payment_method=payment_method,
+        status=status
+    )
+    delta = {"count": F("count") + count, "amount": F("amount") + amount}
+
+    if bucket.update(**delta):
+        return
+    try:
+        with transaction.atomic():
+            PaymentDailyRollup.objects.create(
+                day=day,
+                payment_method=payment_method,
+                status=status,
+                count=count,
+                amount=amount
+            )
+    except IntegrityError:
+        # another request created the bucket first
+        bucket.update(**delta)
+
+
+def apply_deltas(deltas):
+    """deltas: {(day, payment_method, status): [count, amount]}"""
+    for (day, payment_method, status), (count, amount) in deltas.items():
+        if count or amount:
+            _bump(day, payment_method, status, count, amount)
+
+
+def _decimal(value):
+    return Decimal(str(value or 0))
+
+
+def _key(created_at, payment_method, status):
+    return timezone.localtime(created_at).date(), payment_method or "", status
+
+
+def record_created(payment):
+    day, method, status = _key(payment.created_at, payment.payment_method, payment.status)
+    _bump(day, method, status, 1, _decimal(payment.amount))
+
+
+def record_transitions(transitions):
+    """
+    transitions: iterable of (before, after) dicts holding created_at,
+    payment_method, status and amount for each payment that changed.
+    """
+    deltas = defaultdict(lambda: [0, Decimal(0)])
+
+    for before, after in transitions:
+        old = deltas[_key(before["created_at"], before["payment_method"], before["status"])]
+        old[0] -= 1
+        old[1] -= _decimal(before["amount"])
+
+        new = deltas[_key(before["created_at"], after["payment_method"], after["status"])]
+        new[0] += 1
+        new[1] += _decimal(after["amount"])
+
+    apply_deltas(deltas)
+
+
+def rebuild(start=None, end=None):
+    """
+    Recompute rollup rows from Payment for days in [start, end]. Used as a
+    periodic backfill to correct any drift in the incremental counters.
+    """
+    payments = Payment.objects.annotate(day=TruncDate("created_at"))
+    rollups = PaymentDailyRollup.objects.all()
+    if start:
+        payments = payments.filter(day__gte=start)
+        rollups = rollups.filter(day__gte=start)
+    if end:
+        payments = payments.filter(day__lte=end)
+        rollups = rollups.filter(day__lte=end)
+
+    rows = payments.values("day", "payment_method", "status")\
+        .annotate(count=Count("id"), amount=Sum("amount"))\
+        .order_by()
+
+    with transaction.atomic():
+        rollups.delete()
+        PaymentDailyRollup.objects.bulk_create([
+            PaymentDailyRollup(
+                day=row["day"],
+                payment_method=row["payment_method"] or "",
+                status=row["status"],
+                count=row["count"],
+                amount=row["amount"] or 0,
+            )
+            for row in rows
+        ])
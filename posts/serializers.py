@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Payment, Post, Comment
+from .models import DeletionJob, Payment, Post, Comment
 from decouple import config
 
 
@@ -73,6 +73,11 @@ class PostSerializer(serializers.ModelSerializer):
             'caption',
             'image',
             'video_url',
+            'video_status',
+            'video_content_type',
+            'video_size',
+            'video_duration',
+            'video_thumbnail',
             'created_at',
 
             'total_likes',
@@ -83,6 +88,14 @@ class PostSerializer(serializers.ModelSerializer):
             'total_comments',
             'comments'
         ]
+        # filled in by posts/media.py once video_url has been inspected
+        read_only_fields = [
+            'video_status',
+            'video_content_type',
+            'video_size',
+            'video_duration',
+            'video_thumbnail',
+        ]
     def get_user_profile_picture(self, obj):
         if obj.user.profile_picture:
             return obj.user.profile_picture.url
@@ -127,4 +140,22 @@ class PaymentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Payment
-        fields = ['id', 'user', 'order_id', 'transaction_id', 'created_at', 'amount', 'payment_method', 'status']
\ No newline at end of file
+        fields = ['id', 'user', 'order_id', 'transaction_id', 'created_at', 'amount', 'payment_method', 'status']
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = DeletionJob
+        fields = ['id', 'kind', 'object_id', 'status', 'step', 'deleted_rows', 'error', 'created_at', 'updated_at']
+
+
+class PostImportSerializer(serializers.ModelSerializer):
+    """One item of a batch import; `image` is an upload, `image_url` a remote file."""
+
+    image = serializers.ImageField(required=False)
+    image_url = serializers.URLField(required=False)
+
+    class Meta:
+        model = Post
+        fields = ['caption', 'image', 'image_url', 'video_url']
@@ -0,0 +1,70 @@
+import requests
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from sslcommerz_lib import SSLCOMMERZ
+
+from posts.gateway import CircuitBreaker, GatewayError, GatewayUnavailable
+
+
+class PaymentGateway(SSLCOMMERZ):
+    """
+    SSLCOMMERZ client that reuses one keep-alive HTTP session per process,
+    enforces connect/read timeouts and stops calling the gateway while it
+    keeps failing.
+    """
+
+    def __init__(self, config):
+        super().__init__({
+            'store_id': config['STORE_ID'],
+            'store_pass': config['STORE_PASS'],
+            'issandbox': config['IS_SANDBOX'],
+        })
+
+        base_url = config.get('BASE_URL')
+        if base_url:
+            base_url = base_url.rstrip('/')
+            self.createSessionUrl = f"{base_url}/gwprocess/v4/api.php"
+            self.validation_url = f"{base_url}/validator/api/validationserverAPI.php"
+            self.transaction_url = f"{base_url}/validator/api/merchantTransIDvalidationAPI.php"
+
+        self.timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+        self.breaker = CircuitBreaker(
+            failure_threshold=config['BREAKER_FAILURE_THRESHOLD'],
+            reset_timeout=config['BREAKER_RESET_TIMEOUT'],
+        )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=config['POOL_MAXSIZE'],
+            max_retries=0,
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def call_api(self, method, url, payload):
+        if not self.breaker.allow():
+            raise GatewayUnavailable("Payment gateway circuit is open")
+
+        try:
+            if method == 'POST':
+                response = self.session.post(url, data=payload, timeout=self.timeout)
+            else:
+                response = self.session.get(url, params=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as exc:
+            self.breaker.record_failure()
+            raise GatewayError(str(exc)) from exc
+
+        self.breaker.record_success()
+        return data
+
+    async def acreateSession(self, post_body):
+        return await sync_to_async(self.createSession, thread_sensitive=False)(post_body)
+
+    async def avalidationTransactionOrder(self, validation_id):
+        return await sync_to_async(self.validationTransactionOrder, thread_sensitive=False)(validation_id)
+
+    async def atransaction_query_tranid(self, tran_id):
+        return await sync_to_async(self.transaction_query_tranid, thread_sensitive=False)(tran_id)
@@ -1,3 +1,1033 @@
-from django.test import TestCase
+import json
+import struct
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+import requests
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F, Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from api.models import Task
+from api.taskqueue import claim_due, run_claimed
+from posts import activity, gateway, media, ranking, rollups
+from posts.deletion import run_job
+from posts.models import (
+    Comment, DeletionJob, Payment, PaymentDailyRollup, PaymentEvent, Post, PostActivity
+)
+from posts.paginations import KeysetPagination, ScoreKeysetPagination
+from posts.payments import bulk_apply_statuses, reconcile_payment
+from users.models import User
+from users.stats import get_stats, stats_cache_key
+
+
+class StubServer:
+    """
+    Local HTTP server for tests. `routes` maps a path to a function
+    (handler, query) -> (status, headers, body); unknown paths are 404.
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def respond(self, send_body):
+                url = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    query.update({key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()})
+                stub.requests.append((self.command, url.path, query))
+
+                route = stub.routes.get(url.path)
+                status, headers, body = route(self, query) if route else (404, {}, b'')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self.respond(True)
+
+            def do_POST(self):
+                self.respond(True)
+
+            def do_HEAD(self):
+                self.respond(False)
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+
+            def handle_error(self, request, client_address):
+                # clients that time out on purpose hang up before the reply
+                if not issubclass(sys.exc_info()[0], ConnectionError):
+                    super().handle_error(request, client_address)
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def json_response(data, status=200):
+    return status, {'Content-Type': 'application/json'}, json.dumps(data).encode()
+
+
+class FakeGatewayMixin:
+    """Points the process-wide SSLCOMMERZ client at a StubServer."""
+
+    def use_gateway(self, stub, **options):
+        config = {**settings.SSLCOMMERZ, 'BASE_URL': stub.url, **options}
+        override = override_settings(SSLCOMMERZ=config)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        gateway._gateway = None
+        self.addCleanup(setattr, gateway, '_gateway', None)
+
+
+def mp4_box(kind, payload):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def mp4_file(version, timescale, duration):
+    if version == 1:
+        header = struct.pack('>B3xQQIQ', 1, 0, 0, timescale, duration)
+    else:
+        header = struct.pack('>B3xIIII', 0, 0, 0, timescale, duration)
+    movie = mp4_box(b'moov', mp4_box(b'mvhd', header + bytes(80)))
+    return mp4_box(b'ftyp', b'isom' + bytes(4)) + movie + mp4_box(b'mdat', bytes(512))
+
+
+class KeysetPaginationTests(SimpleTestCase):
+
+    def test_decode_value_must_be_implemented(self):
+        class Unfinished(KeysetPagination):
+            ordering_field = 'score'
+
+        with self.assertRaises(TypeError):
+            Unfinished()
+
+
+class ActivityEventsTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_wsgi_request_is_refused(self):
+        response = self.client.get('/api/events/')
+        self.assertEqual(response.status_code, 501)
+
+    async def test_streams_are_throttled(self):
+        rates = {**api_settings.DEFAULT_THROTTLE_RATES, 'events': '1/min'}
+        with override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': rates}):
+            first = await self.async_client.get('/api/events/')
+            second = await self.async_client.get('/api/events/')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Type'], 'text/event-stream')
+        await first.streaming_content.aclose()
+        self.assertEqual(second.status_code, 429)
+        self.assertIn('Retry-After', second)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('posts.gateway.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = gateway.CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_open)
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_lets_one_trial_through(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        self.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_failed_trial_reopens_and_success_closes(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        self.now += 30
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+
+        self.now += 1
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertFalse(self.breaker.is_open)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+
+class PaymentGatewayTests(FakeGatewayMixin, SimpleTestCase):
+
+    SESSION_PATH = '/gwprocess/v4/api.php'
+
+    def test_slow_gateway_times_out(self):
+        def slow(handler, query):
+            time.sleep(0.5)
+            return json_response({'status': 'SUCCESS'})
+
+        with StubServer({self.SESSION_PATH: slow}) as stub:
+            self.use_gateway(stub, READ_TIMEOUT=0.1)
+            with self.assertRaises(gateway.GatewayError):
+                gateway.get_gateway().createSession({'tran_id': 'txn_1'})
+
+        self.assertEqual(gateway.get_gateway().breaker.failures, 1)
+
+    def test_open_breaker_stops_calling_the_gateway(self):
+        routes = {self.SESSION_PATH: lambda handler, query: (500, {}, b'')}
+        with StubServer(routes) as stub:
+            self.use_gateway(stub, BREAKER_FAILURE_THRESHOLD=2, BREAKER_RESET_TIMEOUT=60)
+            client = gateway.get_gateway()
+            for _ in range(2):
+                with self.assertRaises(gateway.GatewayError):
+                    client.createSession({'tran_id': 'txn_1'})
+            with self.assertRaises(gateway.GatewayUnavailable):
+                client.createSession({'tran_id': 'txn_1'})
+
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_invalid_json_counts_as_failure(self):
+        routes = {self.SESSION_PATH: lambda handler, query: (200, {}, b'<html>')}
+        with StubServer(routes) as stub:
+            self.use_gateway(stub)
+            with self.assertRaises(gateway.GatewayError):
+                gateway.get_gateway().createSession({'tran_id': 'txn_1'})
+
+
+class InitiatePaymentTests(FakeGatewayMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='payer@example.com', password='pw'))
+
+    def initiate(self, answer):
+        with StubServer({'/gwprocess/v4/api.php': answer}) as stub:
+            self.use_gateway(stub)
+            response = self.client.post('/api/payment/initiate/', {'amount': 100, 'order_id': 'o1'})
+        return stub, response
+
+    def test_returns_the_gateway_page(self):
+        stub, response = self.initiate(lambda handler, query: json_response({
+            'status': 'SUCCESS', 'GatewayPageURL': 'https://pay.example.com/x',
+        }))
+
+        self.assertEqual(response.data, {'payment_url': 'https://pay.example.com/x'})
+        self.assertEqual(stub.requests[0][2]['tran_id'], 'txn_o1')
+
+    def test_gateway_failure_is_503(self):
+        _, response = self.initiate(lambda handler, query: (502, {}, b''))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(Payment.objects.get().status, Payment.PENDING)
+
+    def test_open_breaker_is_503_without_a_call(self):
+        with StubServer({'/gwprocess/v4/api.php': lambda handler, query: json_response({})}) as stub:
+            self.use_gateway(stub)
+            gateway.get_gateway().breaker.opened_at = time.monotonic()
+            response = self.client.post('/api/payment/initiate/', {'amount': 100, 'order_id': 'o1'})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(stub.requests, [])
+
+
+class ReconcilePaymentsTests(FakeGatewayMixin, TestCase):
+
+    TRANSACTIONS = {
+        'txn_paid': {'APIConnect': 'DONE', 'element': [{'status': 'VALID'}]},
+        'txn_abandoned': {'APIConnect': 'DONE', 'no_of_trans_found': 0, 'element': []},
+        'txn_open': {'APIConnect': 'DONE', 'element': [{'status': 'PENDING'}]},
+        'txn_rejected': {'APIConnect': 'INVALID_REQUEST'},
+    }
+
+    def query(self, handler, query):
+        return json_response(self.TRANSACTIONS[query['tran_id']])
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='payer@example.com', password='pw')
+        for order_id in ('paid', 'abandoned', 'open', 'rejected'):
+            Payment.objects.create(user=self.user, order_id=order_id, transaction_id='', amount=10)
+        Payment.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+    def statuses(self):
+        return dict(Payment.objects.values_list('order_id', 'status'))
+
+    def test_settles_only_well_formed_answers(self):
+        routes = {'/validator/api/merchantTransIDvalidationAPI.php': self.query}
+        with StubServer(routes) as stub:
+            self.use_gateway(stub)
+            call_command('reconcile_payments', '--rate', '0', stdout=StringIO())
+
+        self.assertEqual(self.statuses(), {
+            'paid': Payment.VERIFIED,
+            'abandoned': Payment.FAILED,
+            'open': Payment.PENDING,
+            'rejected': Payment.PENDING,
+        })
+
+    def test_bad_store_credentials_leave_payments_pending(self):
+        routes = {
+            '/validator/api/merchantTransIDvalidationAPI.php':
+                lambda handler, query: json_response({'APIConnect': 'INACTIVE'}),
+        }
+        with StubServer(routes) as stub:
+            self.use_gateway(stub)
+            call_command('reconcile_payments', '--rate', '0', stdout=StringIO())
+
+        self.assertEqual(set(self.statuses().values()), {Payment.PENDING})
+
+
+@override_settings(TASK_QUEUE={**settings.TASK_QUEUE, 'DISPATCH': 'worker'})
+class ReconcilePaymentTaskTests(FakeGatewayMixin, TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(email='payer@example.com', password='pw')
+        self.payment = Payment.objects.create(user=user, order_id='o1', transaction_id='', amount=10)
+
+    def run_task(self, answer):
+        routes = {'/validator/api/merchantTransIDvalidationAPI.php': lambda handler, query: json_response(answer)}
+        with StubServer(routes) as stub:
+            self.use_gateway(stub)
+            Task.objects.update(run_at=timezone.now())
+            run_claimed(claim_due(1)[0])
+        self.payment.refresh_from_db()
+
+    def test_gateway_errors_never_fail_the_payment(self):
+        reconcile_payment.delay(self.payment.pk)
+        self.run_task({'APIConnect': 'INVALID_REQUEST'})
+
+        self.assertEqual(self.payment.status, Payment.PENDING)
+        self.assertEqual(Task.objects.get().status, Task.PENDING)
+
+    def test_done_response_settles_the_payment(self):
+        reconcile_payment.delay(self.payment.pk)
+        self.run_task({'APIConnect': 'DONE', 'element': []})
+
+        self.assertEqual(self.payment.status, Payment.FAILED)
+        self.assertFalse(Task.objects.exists())
+
+
+class PaymentCallbackTests(FakeGatewayMixin, TestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(email='payer@example.com', password='pw')
+        self.payment = Payment.objects.create(user=user, order_id='o1', transaction_id='', amount=10)
+        self.answer = {'APIConnect': 'DONE', 'element': [
+            {'tran_id': 'txn_o1', 'status': 'VALID', 'amount': '250.00', 'card_type': 'BKASH-BKash'},
+        ]}
+
+    def callback(self, event, **data):
+        routes = {
+            '/validator/api/merchantTransIDvalidationAPI.php': lambda handler, query: json_response(self.answer),
+        }
+        with StubServer(routes) as stub:
+            self.use_gateway(stub)
+            response = self.client.post(f'/api/payment/{event}/', {'tran_id': 'txn_o1', **data})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(stub.requests[0][2]['tran_id'], 'txn_o1')
+        self.payment.refresh_from_db()
+
+    def events(self):
+        return list(PaymentEvent.objects.order_by('pk').values_list('event', 'applied'))
+
+    def test_success_takes_the_amount_from_the_gateway(self):
+        self.callback('success', amount='1.00', card_type='FORGED')
+
+        self.assertEqual(self.payment.status, Payment.VERIFIED)
+        self.assertEqual(self.payment.amount, Decimal('250.00'))
+        self.assertEqual(self.payment.payment_method, 'BKASH-BKash')
+        self.assertEqual(self.payment.transaction_id, 'txn_o1')
+
+    def test_success_unknown_to_the_gateway_is_not_applied(self):
+        self.answer = {'APIConnect': 'DONE', 'no_of_trans_found': 0, 'element': []}
+        self.callback('success', amount='10.00')
+
+        self.assertEqual(self.payment.status, Payment.PENDING)
+        self.assertEqual(self.events(), [('success', False)])
+
+    def test_callback_contradicting_the_gateway_is_not_applied(self):
+        self.callback('fail')
+        self.assertEqual(self.payment.status, Payment.PENDING)
+
+        self.answer['element'][0]['status'] = 'FAILED'
+        self.callback('success')
+        self.assertEqual(self.payment.status, Payment.PENDING)
+        self.assertEqual(self.events(), [('fail', False), ('success', False)])
+
+    def test_unreachable_gateway_leaves_the_payment_pending(self):
+        self.answer = {'APIConnect': 'INVALID_REQUEST'}
+        self.callback('success')
+        self.assertEqual(self.payment.status, Payment.PENDING)
+
+    def test_repeated_success_is_applied_once(self):
+        for _ in range(3):
+            self.callback('success')
+
+        self.assertEqual(self.events(), [('success', True), ('success', False), ('success', False)])
+        rollup = PaymentDailyRollup.objects.get(status=Payment.VERIFIED)
+        self.assertEqual((rollup.count, rollup.amount), (1, Decimal('250.00')))
+
+    def test_fail_after_success_is_ignored(self):
+        self.callback('success')
+        self.answer['element'].insert(0, {'tran_id': 'txn_o1', 'status': 'FAILED'})
+        self.callback('fail')
+
+        self.assertEqual(self.payment.status, Payment.VERIFIED)
+        self.assertEqual(self.events(), [('success', True), ('fail', False)])
+        self.assertEqual(PaymentDailyRollup.objects.get(status=Payment.VERIFIED).count, 1)
+
+
+class Mp4DurationTests(SimpleTestCase):
+
+    def test_version_0_header(self):
+        self.assertEqual(media.mp4_duration(mp4_file(0, 600, 9000)), 15)
+
+    def test_version_1_header(self):
+        self.assertEqual(media.mp4_duration(mp4_file(1, 1000, 2 ** 32 + 500)), 4294967.796)
+
+    def test_missing_or_truncated_movie_header(self):
+        data = mp4_file(0, 600, 9000)
+        self.assertIsNone(media.mp4_duration(data[:40]))
+        self.assertIsNone(media.mp4_duration(mp4_box(b'ftyp', b'isom') + mp4_box(b'mdat', bytes(64))))
+        self.assertIsNone(media.mp4_duration(mp4_file(0, 0, 9000)))
+
+
+@override_settings(MEDIA_INSPECT={**settings.MEDIA_INSPECT, 'ALLOWED_PRIVATE_HOSTS': ['127.0.0.1']})
+class InspectUrlTests(SimpleTestCase):
+
+    def inspect(self, stub, path):
+        with requests.Session() as session:
+            return media.inspect_url(session, stub.url + path)
+
+    def test_oembed_provider(self):
+        routes = {'/oembed': lambda handler, query: json_response({
+            'duration': 42, 'thumbnail_url': 'https://i.ytimg.com/vi/x/hq.jpg',
+        })}
+        with StubServer(routes) as stub, \
+                mock.patch.dict(media.OEMBED_PROVIDERS, {'youtube.com': stub.url + '/oembed'}):
+            with requests.Session() as session:
+                fields = media.inspect_url(session, 'https://www.youtube.com/watch?v=x')
+
+        self.assertEqual(fields['video_status'], 'ready')
+        self.assertEqual(fields['video_duration'], 42)
+        self.assertEqual(fields['video_thumbnail'], 'https://i.ytimg.com/vi/x/hq.jpg')
+        self.assertEqual(stub.requests, [
+            ('GET', '/oembed', {'url': 'https://www.youtube.com/watch?v=x', 'format': 'json'}),
+        ])
+
+    def test_head_is_enough_for_other_files(self):
+        routes = {'/clip.webm': lambda handler, query: (200, {'Content-Type': 'video/webm'}, bytes(1000))}
+        with StubServer(routes) as stub:
+            fields = self.inspect(stub, '/clip.webm')
+
+        self.assertEqual((fields['video_content_type'], fields['video_size']), ('video/webm', 1000))
+        self.assertIsNone(fields['video_duration'])
+        self.assertEqual([request[0] for request in stub.requests], ['HEAD'])
+
+    def test_range_get_when_head_is_refused(self):
+        def clip(handler, query):
+            if handler.command == 'HEAD':
+                return 405, {}, b''
+            self.assertEqual(handler.headers['Range'], 'bytes=0-0')
+            return 206, {'Content-Type': 'video/webm', 'Content-Range': 'bytes 0-0/5000'}, b'\x1a'
+
+        with StubServer({'/clip.webm': clip}) as stub:
+            fields = self.inspect(stub, '/clip.webm')
+
+        self.assertEqual(fields['video_size'], 5000)
+        self.assertEqual([request[0] for request in stub.requests], ['HEAD', 'GET'])
+
+    def test_mp4_duration_from_the_leading_bytes(self):
+        data = mp4_file(0, 1000, 12500)
+
+        def clip(handler, query):
+            headers = {'Content-Type': 'video/mp4'}
+            if 'Range' not in handler.headers:
+                return 200, headers, data
+            end = int(handler.headers['Range'].rpartition('-')[2])
+            headers['Content-Range'] = f'bytes 0-{min(end, len(data) - 1)}/{len(data)}'
+            return 206, headers, data[:end + 1]
+
+        with StubServer({'/clip.mp4': clip}) as stub:
+            fields = self.inspect(stub, '/clip.mp4')
+
+        self.assertEqual(fields['video_duration'], 12.5)
+        self.assertEqual(fields['video_size'], len(data))
+
+    def test_redirects_within_allowed_hosts_are_followed(self):
+        routes = {
+            '/old': lambda handler, query: (301, {'Location': '/clip.webm'}, b''),
+            '/clip.webm': lambda handler, query: (200, {'Content-Type': 'video/webm'}, bytes(10)),
+        }
+        with StubServer(routes) as stub:
+            fields = self.inspect(stub, '/old')
+
+        self.assertEqual(fields['video_size'], 10)
+
+    def test_redirect_to_a_private_host_is_refused(self):
+        with StubServer({}) as stub:
+            port = stub.server.server_port
+            stub.routes['/hop'] = lambda handler, query: (
+                302, {'Location': f'http://localhost:{port}/clip.webm'}, b''
+            )
+            with self.assertRaisesMessage(media.MediaError, 'non-public address'):
+                self.inspect(stub, '/hop')
+
+        self.assertEqual([request[1] for request in stub.requests], ['/hop'])
+
+    def test_redirects_are_capped(self):
+        routes = {'/loop': lambda handler, query: (302, {'Location': '/loop'}, b'')}
+        with StubServer(routes) as stub:
+            with self.assertRaisesMessage(media.MediaError, 'Too many redirects'):
+                self.inspect(stub, '/loop')
+
+        self.assertEqual(len(stub.requests), settings.MEDIA_INSPECT['MAX_REDIRECTS'] + 1)
+
+    def test_only_public_http_urls_are_fetched(self):
+        for url in (
+            'file:///etc/passwd',
+            'ftp://example.com/clip.mp4',
+            'http://localhost/clip.mp4',
+            'http://10.0.0.5/clip.mp4',
+            'http://169.254.169.254/latest/meta-data/',
+            'http://[::1]/clip.mp4',
+            'http://[::ffff:192.168.0.1]/clip.mp4',
+            'http://0.0.0.0/clip.mp4',
+        ):
+            with self.subTest(url=url), self.assertRaises(media.MediaError):
+                media.check_url(url)
+
+
+class TrendingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='reader@example.com', password='pw'))
+
+    def test_limit_is_clamped(self):
+        for limit in ('-5', '0', '1000', 'x'):
+            with self.subTest(limit=limit):
+                response = self.client.get('/api/posts/trending/', {'limit': limit})
+                self.assertEqual(response.status_code, 200)
+
+
+class TopPostsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(email='author@example.com', password='pw')
+
+    def post(self, caption, score):
+        return Post.objects.create(user=self.author, caption=caption, score=score).pk
+
+    def top(self, **params):
+        response = self.client.get('/api/posts/top/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ordered_by_score(self):
+        low, high, middle = self.post('low', 0.1), self.post('high', 3.0), self.post('middle', 1.5)
+        self.assertEqual([post['id'] for post in self.top()['results']], [high, middle, low])
+
+    def test_search_applies(self):
+        cat = self.post('a cat', 1.0)
+        self.post('a dog', 2.0)
+        self.assertEqual([post['id'] for post in self.top(search='cat')['results']], [cat])
+
+    @mock.patch.object(ScoreKeysetPagination, 'page_size', 2)
+    def test_cursor_walks_tied_scores_without_gaps(self):
+        tied = [self.post(str(n), 1.0) for n in range(5)]
+        first = self.post('first', 2.0)
+
+        seen, data = [], self.top()
+        while True:
+            seen += [post['id'] for post in data['results']]
+            if not data['next']:
+                break
+            data = self.client.get(data['next']).data
+
+        self.assertEqual(seen, [first, *sorted(tied, reverse=True)])
+
+    def test_refresh_post_scores(self):
+        now = timezone.now()
+        fresh = Post.objects.create(user=self.author, caption='fresh', score=0)
+        stale = Post.objects.create(user=self.author, caption='stale', score=5)
+        Post.objects.filter(pk=stale.pk).update(created_at=now - timedelta(days=30))
+        for n in range(3):
+            fresh.likes.add(User.objects.create_user(email=f'fan{n}@example.com', password='pw'))
+
+        call_command('refresh_post_scores', stdout=StringIO())
+
+        fresh.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertAlmostEqual(fresh.score, ranking.compute_score(3, 0, fresh.created_at, timezone.now()), places=4)
+        # past RANKING_MAX_AGE_DAYS the score is pinned to 0 and the post leaves the refresh set
+        self.assertEqual(stale.score, 0)
+        self.assertNotIn(stale, ranking.aging_posts())
+
+
+class CommentCreateTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='reader@example.com', password='pw')
+        self.post = Post.objects.create(user=self.user, caption='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def comment(self, post_id):
+        return self.client.post(f'/api/posts/{post_id}/comments/', {'text': 'hi'})
+
+    def test_comment_on_a_live_post(self):
+        self.assertEqual(self.comment(self.post.pk).status_code, 201)
+
+    def test_deleted_or_missing_post_is_404(self):
+        Post.objects.filter(pk=self.post.pk).soft_delete()
+
+        self.assertEqual(self.comment(self.post.pk).status_code, 404)
+        self.assertEqual(self.comment(self.post.pk + 1).status_code, 404)
+        self.assertFalse(Comment.all_objects.exists())
+
+
+# a 1x1 transparent GIF
+GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+class FakeUploadMixin:
+    """Stands in for Cloudinary; `self.uploaded` lists what was sent, by name or URL."""
+
+    def setUp(self):
+        super().setUp()
+        self.uploaded = []
+
+        def upload_resource(source, **options):
+            self.uploaded.append(source if isinstance(source, str) else Path(source.name).name)
+            return CloudinaryResource(
+                f'upload{len(self.uploaded)}', format='gif', version=1, type='upload', resource_type='image'
+            )
+
+        patcher = mock.patch('posts.batch.uploader.upload_resource', side_effect=upload_resource)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class PostBatchTests(FakeUploadMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email='author@example.com', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, items, files=None):
+        if files is None:
+            return self.client.post('/api/posts/batch/', {'posts': items}, format='json')
+        return self.client.post('/api/posts/batch/', {'posts': json.dumps(items), **files}, format='multipart')
+
+    def test_errors_are_reported_per_item(self):
+        with mock.patch('posts.realtime.publish') as publish:
+            response = self.batch([
+                {'caption': 'first'},
+                {'caption': 'bad', 'video_url': 'not a url'},
+                {'caption': 'remote', 'image_url': 'https://img.example.com/a.gif'},
+            ])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        results = response.data['results']
+        self.assertEqual([result['index'] for result in results], [0, 1, 2])
+        self.assertIn('video_url', results[1]['errors'])
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('pk', 'caption')),
+            [(results[0]['id'], 'first'), (results[2]['id'], 'remote')]
+        )
+        self.assertEqual(self.uploaded, ['https://img.example.com/a.gif'])
+        self.assertEqual(
+            [call.kwargs['post_id'] for call in publish.call_args_list if call.args[1] == 'post_created'],
+            [results[0]['id'], results[2]['id']]
+        )
+
+    def test_failed_upload_fails_only_its_item(self):
+        with mock.patch('posts.batch.uploader.upload_resource', side_effect=RuntimeError('quota')):
+            response = self.batch([{'caption': 'a'}, {'image_url': 'https://img.example.com/a.gif'}])
+
+        self.assertEqual(response.data['results'][1]['errors'], {'image': ['Upload failed: quota']})
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_nothing_created_is_400(self):
+        response = self.batch([{'video_url': 'nope'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 1)
+
+    @override_settings(POST_BATCH_MAX_ITEMS=2)
+    def test_too_many_items_is_400(self):
+        response = self.batch([{'caption': str(n)} for n in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('At most 2', response.data['error'])
+        self.assertFalse(Post.objects.exists())
+
+    def test_posts_must_be_a_list_of_objects(self):
+        for items in ([], 'text', [1, 2]):
+            with self.subTest(items=items):
+                self.assertEqual(self.batch(items).status_code, 400)
+
+    def test_multipart_image_names_map_to_files(self):
+        response = self.batch(
+            [{'caption': 'photo', 'image': 'photo'}, {'caption': 'missing', 'image': 'other'}],
+            files={'photo': SimpleUploadedFile('beach.gif', GIF, content_type='image/gif')},
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.uploaded, ['beach.gif'])
+        self.assertIn('image', response.data['results'][1]['errors'])
+        self.assertEqual(Post.objects.get().image.public_id, 'upload1')
+
+
+class ImportPostsTests(FakeUploadMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email='author@example.com', password='pw')
+        self.dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        (self.dir / 'beach.gif').write_bytes(GIF)
+
+    def import_posts(self, name, *options):
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', self.user.email, str(self.dir / name), '--media-dir', str(self.dir),
+                     *options, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_json_list(self):
+        (self.dir / 'posts.json').write_text(json.dumps([
+            {'caption': 'local', 'image': 'beach.gif'},
+            {'caption': 'remote', 'image_url': 'https://img.example.com/a.gif'},
+            {'caption': 'gone', 'image': 'missing.gif'},
+            {'caption': 'bad', 'video_url': 'nope'},
+        ]))
+
+        out, err = self.import_posts('posts.json', '--batch-size', '3')
+
+        self.assertIn('Created 2 posts, 2 failed', out)
+        self.assertIn('Item 2:', err)
+        self.assertIn('Item 3: {"video_url"', err)
+        self.assertEqual(sorted(self.uploaded), ['beach.gif', 'https://img.example.com/a.gif'])
+        self.assertEqual(sorted(Post.objects.values_list('caption', flat=True)), ['local', 'remote'])
+
+    def test_ndjson_export(self):
+        source = User.objects.create_user(email='old@example.com', password='pw')
+        Post.objects.create(user=source, caption='one')
+        post = Post.objects.create(user=source, caption='two', video_url='https://cdn.example.com/v.mp4')
+        Comment.objects.create(user=source, post=post, text='not a post')
+        Payment.objects.create(user=source, order_id='o1', transaction_id='', amount=10)
+        call_command('export_user_data', str(source.pk), '-o', str(self.dir / 'export.ndjson'), stdout=StringIO())
+
+        out, err = self.import_posts('export.ndjson')
+
+        self.assertIn('Created 2 posts, 0 failed', out)
+        self.assertEqual(err, '')
+        imported = Post.objects.filter(user=self.user).order_by('pk')
+        self.assertEqual(
+            list(imported.values_list('caption', 'video_url')),
+            [('one', None), ('two', 'https://cdn.example.com/v.mp4')]
+        )
+
+
+class ModerationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(email='author@example.com', password='pw')
+        self.post = Post.objects.create(user=self.author, caption='hello')
+        self.comment = Comment.objects.create(user=self.author, post=self.post, text='hi')
+        activity.record(self.post.pk, comments=1)
+
+        self.client.force_login(User.objects.create_superuser(email='admin@example.com', password='pw'))
+
+    def run_action(self, model, action, pk):
+        get_stats(self.author.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/admin/posts/{model}/', {'action': action, '_selected_action': [pk]})
+        self.assertEqual(response.status_code, 302)
+
+    def test_delete_posts_soft_deletes(self):
+        self.run_action('post', 'delete_posts', self.post.pk)
+
+        self.assertIsNotNone(Post.all_objects.get().deleted_at)
+        self.assertIsNone(cache.get(stats_cache_key(self.author.pk)))
+        self.assertEqual(get_stats(self.author.pk)['posts_authored'], 0)
+
+    def test_delete_comments_matches_the_api(self):
+        self.run_action('comment', 'delete_comments', self.comment.pk)
+
+        self.assertIsNotNone(Comment.all_objects.get().deleted_at)
+        self.assertEqual(PostActivity.objects.aggregate(n=Sum('comments'))['n'], 0)
+        self.assertEqual(get_stats(self.author.pk)['comments_received'], 0)
+
+    def test_remove_media_clears_video_metadata(self):
+        Post.objects.filter(pk=self.post.pk).update(
+            video_url='https://cdn.example.com/clip.mp4',
+            video_status=Post.VIDEO_READY,
+            video_content_type='video/mp4',
+            video_size=2048,
+            video_duration=15,
+        )
+        self.run_action('post', 'remove_media', self.post.pk)
+
+        post = Post.objects.values('video_url', *media.UNINSPECTED).get()
+        self.assertEqual(post, {'video_url': None, **media.UNINSPECTED})
+
+    def test_clear_reactions_takes_back_activity_and_score(self):
+        for n in range(3):
+            fan = User.objects.create_user(email=f'fan{n}@example.com', password='pw')
+            activity.set_reaction(self.post, fan, like=n < 2)
+        ranking.refresh_post(self.post.pk)
+        self.post.refresh_from_db()
+        baseline = ranking.compute_score(0, 1, self.post.created_at, timezone.now())
+        self.assertGreater(self.post.score, baseline)
+
+        self.run_action('post', 'clear_reactions', self.post.pk)
+
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.likes.exists() or self.post.unlikes.exists())
+        self.assertEqual(PostActivity.objects.aggregate(Sum('likes'), Sum('unlikes')), {
+            'likes__sum': 0, 'unlikes__sum': 0,
+        })
+        self.assertAlmostEqual(self.post.score, baseline, places=4)
+        self.assertEqual(get_stats(self.author.pk)['likes_received'], 0)
+
+    def test_api_comment_delete_takes_back_activity(self):
+        api = APIClient()
+        api.force_authenticate(self.author)
+        response = api.delete(f'/api/posts/{self.post.pk}/comments/{self.comment.pk}/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(PostActivity.objects.aggregate(n=Sum('comments'))['n'], 0)
+
+
+@override_settings(DELETION_RUN_IN_THREAD=False, DELETION_CHUNK_SIZE=2)
+class UserDeletionJobTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='pw')
+        self.user = User.objects.create_user(email='leaving@example.com', password='pw')
+        other = User.objects.create_user(email='other@example.com', password='pw')
+
+        posts = [Post.objects.create(user=self.user, caption=str(n)) for n in range(5)]
+        Comment.objects.create(user=other, post=posts[0], text='on their post')
+        other_post = Post.objects.create(user=other, caption='stays')
+        other_post.likes.add(self.user)
+        Payment.objects.create(user=self.user, order_id='o1', transaction_id='', amount=10)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_destroy_starts_a_job(self):
+        response = self.client.delete(f'/api/admin/users/{self.user.pk}/')
+
+        self.assertEqual(response.status_code, 202)
+        job = DeletionJob.objects.get(pk=response.data['job_id'])
+        self.assertEqual((job.kind, job.object_id, job.status), (DeletionJob.USER, self.user.pk, DeletionJob.PENDING))
+        self.assertEqual(job.requested_by, self.admin)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+    def test_admin_cannot_delete_themselves(self):
+        response = self.client.delete(f'/api/admin/users/{self.admin.pk}/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DeletionJob.objects.exists())
+
+    def test_job_deletes_in_chunks(self):
+        job_id = self.client.delete(f'/api/admin/users/{self.user.pk}/').data['job_id']
+
+        with CaptureQueriesContext(connection) as queries:
+            run_job(job_id)
+
+        post_deletes = [q for q in queries if q['sql'].startswith('DELETE FROM "posts_post" ')]
+        self.assertEqual(len(post_deletes), 3)
+        job = DeletionJob.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.step), (DeletionJob.DONE, ''))
+        # 5 posts, a comment on them, a like, a payment and the user
+        self.assertEqual(job.deleted_rows, 9)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(list(Post.all_objects.values_list('caption', flat=True)), ['stays'])
+        self.assertFalse(Post.likes.through.objects.exists())
+
+    def test_failure_is_recorded_and_resumable(self):
+        job_id = self.client.delete(f'/api/admin/users/{self.user.pk}/').data['job_id']
+
+        with mock.patch('posts.deletion.Payment.objects.filter', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                run_job(job_id)
+
+        job = DeletionJob.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.step, job.error), (DeletionJob.FAILED, 'posts', 'db down'))
+        self.assertFalse(Post.all_objects.filter(user=self.user).exists())
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+
+        # a failed job is only picked up again once an operator resets it
+        call_command('process_deletion_jobs', stdout=StringIO())
+        self.assertEqual(DeletionJob.objects.get(pk=job_id).status, DeletionJob.FAILED)
+        DeletionJob.objects.filter(pk=job_id).update(status=DeletionJob.PENDING)
+        call_command('process_deletion_jobs', stdout=StringIO())
+        self.assertEqual(DeletionJob.objects.get(pk=job_id).status, DeletionJob.DONE)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+
+
+class PaymentRollupTests(FakeGatewayMixin, TestCase):
+
+    ANSWERS = {
+        'txn_o1': {'APIConnect': 'DONE', 'element': [{'status': 'VALID', 'amount': '250.00', 'card_type': 'VISA'}]},
+        'txn_o2': {'APIConnect': 'DONE', 'element': [{'status': 'FAILED'}]},
+    }
+
+    def setUp(self):
+        user = User.objects.create_user(email='payer@example.com', password='pw')
+        self.payments = {}
+        for order_id in ('o1', 'o2', 'o3'):
+            payment = Payment.objects.create(user=user, order_id=order_id, transaction_id='', amount=10)
+            # what initiate_payment records for a new payment
+            rollups.record_created(payment)
+            self.payments[order_id] = payment
+
+    def callback(self, event, order_id):
+        routes = {
+            '/validator/api/merchantTransIDvalidationAPI.php':
+                lambda handler, query: json_response(self.ANSWERS[query['tran_id']]),
+        }
+        with StubServer(routes) as stub:
+            self.use_gateway(stub)
+            self.client.post(f'/api/payment/{event}/', {'tran_id': f'txn_{order_id}'})
+
+    def totals(self):
+        return {
+            (row.payment_method, row.status): (row.count, row.amount)
+            for row in PaymentDailyRollup.objects.all()
+            if row.count or row.amount
+        }
+
+    def settle(self):
+        self.callback('success', 'o1')
+        bulk_apply_statuses({self.payments['o2'].pk: Payment.FAILED})
+
+    def test_callbacks_and_reconciliation_move_payments_between_buckets(self):
+        self.assertEqual(self.totals(), {('', Payment.PENDING): (3, Decimal(30))})
+
+        self.settle()
+
+        self.assertEqual(self.totals(), {
+            ('', Payment.PENDING): (1, Decimal(10)),
+            ('', Payment.FAILED): (1, Decimal(10)),
+            ('VISA', Payment.VERIFIED): (1, Decimal(250)),
+        })
+
+    def test_second_transition_is_not_counted(self):
+        self.settle()
+        settled = self.totals()
+
+        self.callback('success', 'o1')
+        self.callback('fail', 'o2')
+        bulk_apply_statuses({self.payments['o1'].pk: Payment.FAILED, self.payments['o2'].pk: Payment.CANCELLED})
+
+        self.assertEqual(self.totals(), settled)
+
+    def test_rebuild_matches_the_incremental_totals(self):
+        self.settle()
+        incremental = self.totals()
+        # drift the incremental counters; the rebuild starts from Payment
+        PaymentDailyRollup.objects.update(count=F('count') + 5)
+
+        call_command('rebuild_payment_rollups', stdout=StringIO())
+
+        self.assertEqual(self.totals(), incremental)
+
+
+class PaymentReportTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='pw'))
+
+    def test_date_range(self):
+        response = self.client.get('/api/admin/payment-reports/daily/', {'start': '2024-02-01', 'end': '2024-02-29'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_dates_are_400(self):
+        for params in ({'start': '2024-02-30'}, {'end': '2024-13-01'}, {'start': 'yesterday'}):
+            with self.subTest(params=params):
+                response = self.client.get('/api/admin/payment-reports/daily/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.data)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='pw'))
+        self.user = User.objects.create_user(email='author@example.com', password='pw')
+
+    def test_admin_exports_another_user(self):
+        response = self.client.get('/api/export/', {'user_id': self.user.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'snapbook-export-{self.user.pk}', response['Content-Disposition'])
+        b''.join(response.streaming_content)
+
+    def test_bad_user_id(self):
+        self.assertEqual(self.client.get('/api/export/', {'user_id': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/export/', {'user_id': self.user.pk + 100}).status_code, 404)
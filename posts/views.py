@@ -1,22 +1,40 @@
-from django.shortcuts import redirect
-from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
-from rest_framework.decorators import action, permission_classes
-from rest_framework.permissions import IsAuthenticated, AllowAny
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet, ViewSet
+from rest_framework.decorators import action, permission_classes, throttle_classes
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
 from SnapBook.settings import FRONTEND_URL, BACKEND_URL
-from posts.models import Payment, Post,  Comment
-from posts.serializers import PostSerializer, CommentSerializer, EmptySerializer, PaymentSerializer
+from SnapBook.throttling import EventStreamThrottle, PaymentThrottle
+from posts.models import DeletionJob, Payment, PaymentDailyRollup, PaymentEvent, Post,  Comment
+from posts.serializers import PostSerializer, CommentSerializer, EmptySerializer, PaymentSerializer, DeletionJobSerializer
 from rest_framework import serializers
 from posts.permissions import IsCommentAuthorOrReadOnly
 from rest_framework.filters import SearchFilter
-from django.db.models import Prefetch
+from django.db import transaction
+from django.db.models import Prefetch, Q, Sum
+from django.utils.dateparse import parse_date
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.decorators import api_view
-from sslcommerz_lib import SSLCOMMERZ 
+from posts.gateway import GatewayError, get_gateway
+from posts.batch import create_posts
+from posts.deletion import soft_delete_comments, soft_delete_posts
+from posts.payments import process_callback, reconcile_payment
+from posts import activity, exports, media, ranking, realtime, rollups
+from posts.paginations import CreatedKeysetPagination, ScoreKeysetPagination
+from users.authors import author_card, get_author
+from users.stats import invalidate_post_owner, invalidate_stats
 
 
 class PostViewSet(ModelViewSet):
@@ -25,6 +43,15 @@ class PostViewSet(ModelViewSet):
     filter_backends = [SearchFilter]
     search_fields = ['caption', 'user__email', 'user__first_name', 'user__last_name']
     permission_classes = [IsAuthenticated]
+    read_replica = True
+    throttle_scopes = {
+        'list': 'feed',
+        'retrieve': 'feed',
+        'top': 'feed',
+        'trending': 'feed',
+        'like': 'reactions',
+        'unlike': 'reactions',
+    }
 
     def get_queryset(self):
         return Post.objects.all()\
@@ -37,7 +64,7 @@ class PostViewSet(ModelViewSet):
             .order_by('-created_at')
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'trending', 'top']:
             return [AllowAny()]
         return [IsAuthenticated()]
 
@@ -58,6 +85,47 @@ class PostViewSet(ModelViewSet):
         """Retrieve a specific post"""
         return super().retrieve(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        operation_summary="Top posts",
+        operation_description=(
+            "Posts ranked by reactions, recent comments and recency. "
+            "Follow `next` to page through them."
+        ),
+        responses={200: PostSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'], pagination_class=ScoreKeysetPagination)
+    def top(self, request):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @swagger_auto_schema(
+        operation_summary="Trending posts",
+        operation_description=(
+            "Posts ranked by recent comments and reactions, older activity counting for less. "
+            "`by=discussed` ranks by comments only."
+        ),
+        manual_parameters=[
+            openapi.Parameter('by', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=sorted(activity.RANKINGS)),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: PostSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        mode = request.query_params.get("by", "trending")
+        if mode not in activity.RANKINGS:
+            return Response({"error": "Unknown ranking"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 20)), 100))
+        except ValueError:
+            limit = 20
+
+        post_ids = activity.ranked_post_ids(mode, limit)
+        posts = self.get_queryset().in_bulk(post_ids)
+        ranked = [posts[pk] for pk in post_ids if pk in posts]
+
+        return Response(self.get_serializer(ranked, many=True).data)
+
     @swagger_auto_schema(
         operation_summary="Create a new post",
         operation_description="Authenticated users can create posts with image or video URL.",
@@ -72,7 +140,59 @@ class PostViewSet(ModelViewSet):
         return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        post = serializer.save(user=self.request.user, score=ranking.initial_score())
+        invalidate_stats(post.user_id)
+        media.schedule([post.pk])
+        realtime.post_created(post)
+
+    def perform_update(self, serializer):
+        previous = serializer.instance.video_url
+        video_changed = serializer.validated_data.get('video_url', previous) != previous
+
+        post = serializer.save(**(media.UNINSPECTED if video_changed else {}))
+        if video_changed:
+            media.schedule([post.pk])
+
+    @swagger_auto_schema(
+        operation_summary="Create many posts at once",
+        operation_description=(
+            "Send `posts` as a JSON list of {caption, video_url, image_url}. With multipart "
+            "uploads `posts` is a JSON string and an item's `image` names a file field. "
+            "Each item is validated on its own; the response lists the created id or "
+            "the errors for every item."
+        ),
+        responses={201: "Per-item results", 400: "Bad Request"}
+    )
+    @action(detail=False, methods=['post'], url_path='batch', serializer_class=EmptySerializer)
+    def batch(self, request):
+        items = request.data.get("posts")
+        if isinstance(items, str):
+            try:
+                items = json.loads(items)
+            except ValueError:
+                items = None
+
+        if not isinstance(items, list) or not items or not all(isinstance(item, dict) for item in items):
+            return Response({"error": "posts must be a non-empty list of objects"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.POST_BATCH_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {settings.POST_BATCH_MAX_ITEMS} posts per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        for item in items:
+            if isinstance(item.get("image"), str):
+                # a name without a matching file fails validation as "not a file"
+                item["image"] = request.FILES.get(item["image"], item["image"])
+
+        results = create_posts(request.user, items)
+        created = sum(1 for result in results if "id" in result)
+
+        return Response({
+            "created": created,
+            "failed": len(results) - created,
+            "results": results,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
 
     @swagger_auto_schema(
         operation_summary="Update a post",
@@ -113,7 +233,8 @@ class PostViewSet(ModelViewSet):
             if instance.user != self.request.user:
                 raise serializers.ValidationError("You do not have permission to delete this post.")
 
-        instance.delete()
+        # hidden now, purge_deleted_content removes it off-peak
+        soft_delete_posts(Post.objects.filter(pk=instance.pk))
 
     @swagger_auto_schema(
         operation_summary="Like a post",
@@ -129,13 +250,17 @@ class PostViewSet(ModelViewSet):
         post = self.get_object()
         user = request.user
 
-        post.unlikes.remove(user)
-        post.likes.add(user)
+        activity.set_reaction(post, user, like=True)
+        ranking.refresh_post(post.pk)
+
+        total_likes = post.likes.count()
+        total_unlikes = post.unlikes.count()
+        realtime.counters_changed(post.pk, total_likes, total_unlikes)
 
         return Response({
             "message": "Post liked successfully.",
-            "total_likes": post.likes.count(),
-            "total_unlikes": post.unlikes.count(),
+            "total_likes": total_likes,
+            "total_unlikes": total_unlikes,
         }, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
@@ -152,25 +277,96 @@ class PostViewSet(ModelViewSet):
         post = self.get_object()
         user = request.user
 
-        post.likes.remove(user)
-        post.unlikes.add(user)
+        activity.set_reaction(post, user, like=False)
+        ranking.refresh_post(post.pk)
+
+        total_likes = post.likes.count()
+        total_unlikes = post.unlikes.count()
+        realtime.counters_changed(post.pk, total_likes, total_unlikes)
 
         return Response({
             "message": "Post unliked successfully.",
-            "total_likes": post.likes.count(),
-            "total_unlikes": post.unlikes.count()
+            "total_likes": total_likes,
+            "total_unlikes": total_unlikes
         }, status=status.HTTP_200_OK)
 
 
 
 
+class AuthorPostViewSet(ReadOnlyModelViewSet):
+    """
+    Public author page: one author's posts, newest first, paged by keyset
+    over post_live_author_idx. The author comes from the cache and is
+    attached to each post, so the page never joins the users table.
+    """
+
+    serializer_class = PostSerializer
+    permission_classes = [AllowAny]
+    pagination_class = CreatedKeysetPagination
+    read_replica = True
+    throttle_scope = 'feed'
+
+    def get_author(self):
+        if not hasattr(self, '_author'):
+            self._author = get_author(self.kwargs['user_pk'])
+            if self._author is None:
+                raise Http404("User not found")
+        return self._author
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Post.objects.none()
+
+        return Post.objects.filter(user_id=self.get_author().pk)\
+            .prefetch_related(
+                'likes',
+                'unlikes',
+                Prefetch('comments', queryset=Comment.objects.select_related('user'))
+            )
+
+    def attach_author(self, posts):
+        author = self.get_author()
+        for post in posts:
+            post.user = author
+        return posts
+
+    @swagger_auto_schema(
+        operation_summary="Author's posts",
+        operation_description=(
+            "Public profile of a user (`author`, with stats) and their posts, newest first. "
+            "Follow `next` to page through them."
+        ),
+        responses={200: PostSerializer(many=True)}
+    )
+    def list(self, request, *args, **kwargs):
+        page = self.attach_author(self.paginate_queryset(self.get_queryset()))
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response.data = {'author': author_card(self.get_author()), **response.data}
+        return response
+
+    @swagger_auto_schema(
+        operation_summary="Retrieve an author's post",
+        responses={200: PostSerializer}
+    )
+    def retrieve(self, request, *args, **kwargs):
+        post = self.attach_author([self.get_object()])[0]
+        return Response(self.get_serializer(post).data)
+
+
 class CommentViewSet(ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = [IsCommentAuthorOrReadOnly]
+    read_replica = True
+    throttle_scopes = {
+        'list': 'feed',
+        'retrieve': 'feed',
+        'create': 'comments',
+    }
 
     def get_queryset(self):
         return Comment.objects.filter(
-            post_id=self.kwargs.get('post_pk')
+            post_id=self.kwargs.get('post_pk'),
+            post__deleted_at__isnull=True
         ).select_related('user')
 
     def get_serializer_context(self):
@@ -209,10 +405,19 @@ class CommentViewSet(ModelViewSet):
         return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.save(
+        post_id = self.kwargs.get('post_pk')
+        # Post.objects leaves out soft-deleted posts
+        if not Post.objects.filter(pk=post_id).exists():
+            raise Http404("Post not found")
+
+        comment = serializer.save(
             user=self.request.user,
-            post_id=self.kwargs.get('post_pk')
+            post_id=post_id
         )
+        activity.record(comment.post_id, comments=1)
+        invalidate_post_owner(comment.post_id)
+        ranking.refresh_post(comment.post_id)
+        realtime.comment_created(comment)
 
     @swagger_auto_schema(
         operation_summary="Update a comment",
@@ -236,6 +441,9 @@ class CommentViewSet(ModelViewSet):
         """Delete comment (owner only)"""
         return super().destroy(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        soft_delete_comments(Comment.objects.filter(pk=instance.pk))
+
     
 
 
@@ -243,8 +451,15 @@ class MyPostViewSet(ModelViewSet):
 
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
+    throttle_scopes = {
+        'like': 'reactions',
+        'unlike': 'reactions',
+    }
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Post.objects.none()
+
         user = self.request.user
 
         queryset = Post.objects.select_related('user')\
@@ -287,7 +502,18 @@ class MyPostViewSet(ModelViewSet):
         return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        post = serializer.save(user=self.request.user, score=ranking.initial_score())
+        invalidate_stats(post.user_id)
+        media.schedule([post.pk])
+        realtime.post_created(post)
+
+    def perform_update(self, serializer):
+        previous = serializer.instance.video_url
+        video_changed = serializer.validated_data.get('video_url', previous) != previous
+
+        post = serializer.save(**(media.UNINSPECTED if video_changed else {}))
+        if video_changed:
+            media.schedule([post.pk])
 
     @swagger_auto_schema(
         operation_summary="Update own post",
@@ -309,6 +535,9 @@ class MyPostViewSet(ModelViewSet):
         """Delete only your own post"""
         return super().destroy(request, *args, **kwargs)
 
+    def perform_destroy(self, instance):
+        soft_delete_posts(Post.objects.filter(pk=instance.pk))
+
     @swagger_auto_schema(
         operation_summary="Like your own post",
         operation_description="User can like a post they own.",
@@ -330,13 +559,17 @@ class MyPostViewSet(ModelViewSet):
         post = self.get_object()
         user = request.user
 
-        post.unlikes.remove(user)
-        post.likes.add(user)
+        activity.set_reaction(post, user, like=True)
+        ranking.refresh_post(post.pk)
+
+        total_likes = post.likes.count()
+        total_unlikes = post.unlikes.count()
+        realtime.counters_changed(post.pk, total_likes, total_unlikes)
 
         return Response({
             "message": "Post liked successfully.",
-            "total_likes": post.likes.count(),
-            "total_unlikes": post.unlikes.count(),
+            "total_likes": total_likes,
+            "total_unlikes": total_unlikes,
         }, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
@@ -360,18 +593,23 @@ class MyPostViewSet(ModelViewSet):
         post = self.get_object()
         user = request.user
 
-        post.likes.remove(user)
-        post.unlikes.add(user)
+        activity.set_reaction(post, user, like=False)
+        ranking.refresh_post(post.pk)
+
+        total_likes = post.likes.count()
+        total_unlikes = post.unlikes.count()
+        realtime.counters_changed(post.pk, total_likes, total_unlikes)
 
         return Response({
             "message": "Post unliked successfully.",
-            "total_likes": post.likes.count(),
-            "total_unlikes": post.unlikes.count()
+            "total_likes": total_likes,
+            "total_unlikes": total_unlikes
         }, status=status.HTTP_200_OK)
     
 
 
 @api_view(['POST'])
+@throttle_classes([PaymentThrottle])
 def initiate_payment(request):
     user = request.user
     amount = request.data.get("amount")
@@ -381,17 +619,17 @@ def initiate_payment(request):
         return Response({"error": "Amount and order_id required"}, status=400)
     
     # CREATE PAYMENT FIRST
-    Payment.objects.create(
-        user=user,
-        order_id=order_id,
-        amount=amount,
-        status="pending"
-    )
+    with transaction.atomic():
+        payment = Payment.objects.create(
+            user=user,
+            order_id=order_id,
+            amount=amount,
+            status="pending"
+        )
+        rollups.record_created(payment)
+        # settles the payment if no callback arrives
+        reconcile_payment.enqueue(args=(payment.pk,), countdown=settings.PAYMENT_RECONCILE_AFTER_SECONDS)
 
-    settings = { 'store_id': 'snapb69aef72da647b',
-                 'store_pass': 'snapb69aef72da647b@ssl', 
-                 'issandbox': True }
-    sslcz = SSLCOMMERZ(settings)
     post_body = {}
     post_body['total_amount'] = amount
     post_body['currency'] = "BDT"
@@ -414,8 +652,13 @@ def initiate_payment(request):
     post_body['product_profile'] = "general"
 
 
-    response = sslcz.createSession(post_body) # API response
- 
+    try:
+        response = get_gateway().createSession(post_body) # API response
+    except GatewayError:
+        return Response(
+            {"error": "Payment gateway unavailable"},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
 
     if response.get("status") == "SUCCESS":
         return Response({"payment_url": response["GatewayPageURL"]})
@@ -430,34 +673,174 @@ def initiate_payment(request):
 @permission_classes([AllowAny])
 def payment_success(request):
 
-    tran_id = request.POST.get("tran_id")
-    amount = request.POST.get("amount")
-    payment_method = request.POST.get("card_type")
+    process_callback(PaymentEvent.SUCCESS, request.POST.dict())
 
-    order_id = tran_id.replace("txn_", "")
+    return redirect(f"{FRONTEND_URL}/order-history")
 
-    payment = Payment.objects.filter(order_id=order_id).first()
 
-    if payment:
-        payment.transaction_id = tran_id
-        payment.amount = amount
-        payment.payment_method = payment_method
-        payment.status = "verified"
-        payment.save()
 
-    return redirect(f"{FRONTEND_URL}/order-history")
 
+@swagger_auto_schema(
+    method='get',
+    operation_summary="Export your data",
+    operation_description=(
+        "Stream your posts, comments and payments as NDJSON or CSV, "
+        "optionally gzip-compressed. Admins may export any user with `user_id`."
+    ),
+    manual_parameters=[
+        openapi.Parameter('file_format', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(exports.FORMATS)),
+        openapi.Parameter('types', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                          description="Comma separated subset of posts,comments,payments"),
+        openapi.Parameter('gzip', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN),
+        openapi.Parameter('user_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+    ],
+    responses={200: "File download"}
+)
+@api_view(['GET'])
+def export_data(request):
+    params = request.query_params
+    fmt = params.get("file_format", "ndjson")
+    types = [name for name in params.get("types", ",".join(exports.EXPORTS)).split(",") if name]
+    compress = params.get("gzip", "").lower() in ("1", "true", "yes")
+
+    if fmt not in exports.FORMATS or not types or set(types) - set(exports.EXPORTS):
+        return Response({"error": "Invalid file_format or types"}, status=status.HTTP_400_BAD_REQUEST)
 
+    user = request.user
+    if params.get("user_id") and request.user.is_staff:
+        try:
+            user_id = int(params["user_id"])
+        except ValueError:
+            return Response({"error": "user_id must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        user = get_object_or_404(get_user_model(), pk=user_id)
+
+    filename = f"snapbook-export-{user.pk}.{fmt}"
+    content_type = exports.FORMATS[fmt]
+    if compress:
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = StreamingHttpResponse(
+        exports.stream_export(user, types, fmt, compress),
+        content_type=content_type
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+async def activity_events(request):
+    """
+    Server-Sent Events stream of new posts (`feed=1`) and of reactions and
+    comments on the posts listed in `posts=1,2,3`. Served under ASGI only:
+    a WSGI server would buffer the endless stream and hold a worker forever.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Event streams need the ASGI server", status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    throttle = EventStreamThrottle()
+    if not await sync_to_async(throttle.allow_request)(request, None):
+        response = HttpResponse("Too many event streams", status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response["Retry-After"] = str(math.ceil(throttle.wait()))
+        return response
+
+    try:
+        post_ids = {int(pk) for pk in request.GET.get("posts", "").split(",") if pk}
+    except ValueError:
+        return HttpResponseBadRequest("posts must be a comma separated list of ids")
+    if len(post_ids) > settings.REALTIME_MAX_POSTS:
+        return HttpResponseBadRequest(f"At most {settings.REALTIME_MAX_POSTS} posts per stream")
+
+    channels = [realtime.post_channel(pk) for pk in sorted(post_ids)]
+    if request.GET.get("feed", "1" if not post_ids else "0") in ("1", "true"):
+        channels.append(realtime.FEED)
+
+    response = StreamingHttpResponse(realtime.event_stream(channels), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 class PaymentHistoryViewSet(ReadOnlyModelViewSet):
 
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    read_replica = True
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Payment.objects.none()
 
         return Payment.objects.filter(user=self.request.user).order_by("-created_at")
+
+
+class DeletionJobViewSet(ReadOnlyModelViewSet):
+    """Progress of background user/post deletions (admin only)."""
+
+    queryset = DeletionJob.objects.order_by("-id")
+    serializer_class = DeletionJobSerializer
+    permission_classes = [IsAdminUser]
+
+
+class PaymentReportViewSet(ViewSet):
+    """
+    Admin revenue reports, read from PaymentDailyRollup rather than
+    aggregating the Payment table. Filter with ?start=YYYY-MM-DD&end=YYYY-MM-DD.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get_date(self, name):
+        raw = self.request.query_params.get(name)
+        if not raw:
+            return None
+        try:
+            day = parse_date(raw)
+        except ValueError:
+            # well formed but not a real day, e.g. 2024-02-30
+            day = None
+        if day is None:
+            raise serializers.ValidationError({name: "Enter a valid date as YYYY-MM-DD."})
+        return day
+
+    def get_rollups(self):
+        queryset = PaymentDailyRollup.objects.all()
+
+        start = self.get_date("start")
+        end = self.get_date("end")
+        if start:
+            queryset = queryset.filter(day__gte=start)
+        if end:
+            queryset = queryset.filter(day__lte=end)
+
+        return queryset
+
+    def summarize(self, group_by):
+        verified = Q(status=Payment.VERIFIED)
+        return self.get_rollups()\
+            .values(group_by)\
+            .annotate(
+                payments=Sum("count"),
+                total_amount=Sum("amount"),
+                revenue=Sum("amount", filter=verified, default=0),
+                verified_payments=Sum("count", filter=verified, default=0),
+            )\
+            .filter(payments__gt=0)\
+            .order_by(group_by)
+
+    @swagger_auto_schema(operation_summary="Revenue per day")
+    @action(detail=False, methods=['get'])
+    def daily(self, request):
+        return Response(self.summarize("day"))
+
+    @swagger_auto_schema(operation_summary="Revenue per payment method")
+    @action(detail=False, methods=['get'], url_path='by-method')
+    def by_method(self, request):
+        return Response(self.summarize("payment_method"))
+
+    @swagger_auto_schema(operation_summary="Payment totals per status")
+    @action(detail=False, methods=['get'], url_path='by-status')
+    def by_status(self, request):
+        return Response(self.summarize("status"))
     
 
 
@@ -465,6 +848,7 @@ class PaymentHistoryViewSet(ReadOnlyModelViewSet):
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def payment_cancel(request):
+    process_callback(PaymentEvent.CANCEL, request.POST.dict())
     return redirect(f"{FRONTEND_URL}/order-history")
 
 
@@ -473,4 +857,5 @@ def payment_cancel(request):
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def payment_fail(request):
+    process_callback(PaymentEvent.FAIL, request.POST.dict())
     return redirect(f"{FRONTEND_URL}/order-history")
\ No newline at end of file
@@ -1,14 +1,17 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import User
+from SnapBook.paginators import ApproximateCountPaginator
 
 
 class CustomUserAdmin(UserAdmin):
     model = User
     list_display = ('email', 'first_name', 'last_name', 'is_staff', 'is_active',)
-    list_filter = ('is_staff', 'is_active',)
-    search_fields = ('email',)
-    ordering = ('email',)
+    list_filter = ('is_staff', 'is_active', 'location',)
+    search_fields = ('email', 'first_name', 'last_name',)
+    ordering = ('-date_joined', '-id',)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal Info', {'fields': ('first_name', 'last_name', 'location', 'phone_number', 'profile_picture')}),
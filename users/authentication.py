@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from users.models import CachedUser, User
+
+# only what authorization needs is cached, never the password hash or profile
+AUTH_FIELDS = ('id', 'email', 'is_active', 'is_staff', 'is_superuser')
+
+
+def user_cache_key(user_id):
+    return f"jwt-user:{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def get_auth_fields(user_id):
+    """AUTH_FIELDS of a user as a dict, from the cache or the primary; None if there is no such user."""
+    key = user_cache_key(user_id)
+    fields = cache.get(key)
+    if fields is None:
+        # the primary, so a replica's stale is_active is never cached
+        fields = User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id).values(*AUTH_FIELDS).first()
+        if fields is None:
+            return None
+        cache.set(key, fields, settings.JWT_USER_CACHE_TIMEOUT)
+    return fields
+
+
+def cached_user(fields):
+    names = [field.attname for field in CachedUser._meta.concrete_fields if field.attname in fields]
+    return CachedUser.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the fields authorization needs
+    (AUTH_FIELDS) in the cache for JWT_USER_CACHE_TIMEOUT seconds instead
+    of loading the user row on every request. request.user is a CachedUser
+    holding just those fields; the rest load on first use. Entries are
+    dropped when the user is saved or deleted (users/signals.py), so a
+    deactivated user is refused on the next request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        fields = get_auth_fields(user_id)
+        if fields is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not fields["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return cached_user(fields)
@@ -0,0 +1,50 @@
+"""
+Public author info for profile pages. The author's public fields are
+cached per user (dropped on save/delete by users/signals.py), so a page of
+an author's posts never joins the users table, and the counters come from
+the cached profile stats.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from users.models import User
+from users.stats import get_stats
+
+# what an author page shows; credentials and contact details stay out of the cache
+AUTHOR_FIELDS = ('id', 'email', 'first_name', 'last_name', 'location', 'profile_picture', 'date_joined', 'is_active')
+PUBLIC_STATS = ('posts_authored', 'likes_received', 'comments_received')
+
+
+def author_cache_key(user_id):
+    return f"author:{user_id}"
+
+
+def invalidate_author(user_id):
+    cache.delete(author_cache_key(user_id))
+
+
+def get_author(user_id):
+    """The active user with this id (only AUTHOR_FIELDS loaded), or None."""
+    key = author_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        # the primary, so a lagging replica never fills the cache
+        user = User.objects.using(DEFAULT_DB_ALIAS).only(*AUTHOR_FIELDS).filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, settings.JWT_USER_CACHE_TIMEOUT)
+    return user if user.is_active else None
+
+
+def author_card(user):
+    stats = get_stats(user.pk)
+    return {
+        'id': user.pk,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'location': user.location,
+        'profile_picture': user.profile_picture.url if user.profile_picture else None,
+        'date_joined': user.date_joined,
+        'stats': {name: stats[name] for name in PUBLIC_STATS},
+    }
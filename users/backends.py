@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+
+from users.hashing import PasswordCheckBusy, pooled_check_password
+
+UserModel = get_user_model()
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend that verifies passwords in the hashing process pool and
+    transparently upgrades outdated hashes on a successful login.
+
+    When the pool is saturated the login is refused with PermissionDenied
+    (which stops authenticate() from trying other backends) and the request
+    is flagged `password_check_busy`, which LoginView answers with a 429.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            user = None
+
+        try:
+            is_correct, new_encoded = pooled_check_password(
+                password,
+                user.password if user else None
+            )
+        except PasswordCheckBusy:
+            if request is not None:
+                request.password_check_busy = True
+            raise PermissionDenied("Password checks are saturated")
+
+        if not is_correct:
+            return None
+
+        if new_encoded:
+            user.password = new_encoded
+            user.save(update_fields=['password'])
+
+        if self.user_can_authenticate(user):
+            return user
+        return None
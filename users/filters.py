@@ -0,0 +1,12 @@
+from django_filters import rest_framework as filters
+
+from users.models import User
+
+
+class AdminUserFilter(filters.FilterSet):
+    joined_after = filters.DateTimeFilter(field_name='date_joined', lookup_expr='gte')
+    joined_before = filters.DateTimeFilter(field_name='date_joined', lookup_expr='lt')
+
+    class Meta:
+        model = User
+        fields = ['location', 'is_active', 'is_staff']
@@ -0,0 +1,75 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class PasswordCheckBusy(Exception):
+    """Every hashing worker is taken and the wait queue is full."""
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _check(raw_password, encoded):
+    """
+    Runs in a worker process. Returns (is_correct, new_encoded), where
+    new_encoded is set when the stored hash uses an outdated hasher or
+    work factor and should be replaced.
+    """
+    if encoded is None:
+        # unknown account: burn the same CPU so timing doesn't leak it
+        make_password(raw_password)
+        return False, None
+
+    rehashed = []
+    is_correct = check_password(
+        raw_password,
+        encoded,
+        setter=lambda raw: rehashed.append(make_password(raw))
+    )
+    return is_correct, (rehashed[0] if rehashed else None)
+
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _slots
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = settings.PASSWORD_CHECK_WORKERS
+                _slots = threading.BoundedSemaphore(workers + settings.PASSWORD_CHECK_MAX_PENDING)
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_init_worker,
+                    initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'SnapBook.settings'),),
+                )
+    return _pool, _slots
+
+
+def pooled_check_password(raw_password, encoded):
+    """
+    Verify a password in the dedicated hashing pool so login bursts can't
+    eat the CPU serving other requests. With PASSWORD_CHECK_WORKERS = 0 the
+    check runs inline (e.g. on serverless deployments).
+    """
+    if not settings.PASSWORD_CHECK_WORKERS:
+        return _check(raw_password, encoded)
+
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=settings.PASSWORD_CHECK_WAIT):
+        raise PasswordCheckBusy()
+    try:
+        return pool.submit(_check, raw_password, encoded).result()
+    finally:
+        slots.release()
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models.functions import Upper
 from .managers import CustomUserManager
 from cloudinary.models import CloudinaryField
 # Create your models here.
@@ -31,7 +33,37 @@ class User(AbstractUser):
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # admin user listing: each filter paired with the cursor ordering
+            models.Index(fields=['date_joined', 'id'], name='user_joined_idx'),
+            models.Index(fields=['location', 'date_joined'], name='user_location_joined_idx'),
+            models.Index(fields=['is_active', 'date_joined'], name='user_active_joined_idx'),
+            models.Index(fields=['is_staff', 'date_joined'], name='user_staff_joined_idx'),
+            # admin search: icontains compiles to UPPER(col) LIKE UPPER(%s) on PostgreSQL
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='user_email_trgm_idx'),
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='user_first_name_trgm_idx'),
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='user_last_name_trgm_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
 
+
+
+class CachedUser(User):
+    """
+    A user rebuilt from the authorization fields CachedJWTAuthentication
+    keeps in the cache. The first access to any other field loads all of
+    them in one query.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.issuperset(fields):
+            fields = deferred
+        super().refresh_from_db(using, fields, **kwargs)
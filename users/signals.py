@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.authentication import invalidate_cached_user
+from users.authors import invalidate_author
+from users.models import CachedUser, User
+
+
+# set_password() + save() (djoser set_password / reset) also lands here
+# saves through request.user are sent by the CachedUser proxy
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=CachedUser)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=CachedUser)
+def drop_cached_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+    invalidate_author(instance.pk)
@@ -0,0 +1,62 @@
+"""
+Per-user profile stats: posts authored, likes and comments received on
+them, and verified payments. Computed in one statement and cached per user;
+every write that changes a count drops the entry once it commits.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Payment, Post
+from users.models import User
+
+STATS = ('posts_authored', 'likes_received', 'comments_received', 'payments_made')
+
+
+def stats_cache_key(user_id):
+    return f'profile-stats:{user_id}'
+
+
+def _count(queryset, field):
+    """Correlated COUNT(*) of `queryset` rows whose `field` is the outer user."""
+    counted = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def compute_stats(user_id):
+    # on the primary: whatever is computed here is cached, and a lagging
+    # replica would keep stale counts there after invalidate_stats ran
+    return User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user_id).annotate(
+        posts_authored=_count(Post.objects.all(), 'user'),
+        likes_received=_count(Post.likes.through.objects.filter(post__deleted_at__isnull=True), 'post__user'),
+        comments_received=_count(Comment.objects.filter(post__deleted_at__isnull=True), 'post__user'),
+        payments_made=_count(Payment.objects.filter(status=Payment.VERIFIED), 'user'),
+    ).values(*STATS).first()
+
+
+def get_stats(user_id):
+    key = stats_cache_key(user_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(user_id)
+        cache.set(key, stats, settings.PROFILE_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_stats(*user_ids):
+    """Drop cached stats after the current transaction commits."""
+    keys = [stats_cache_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_post_owner(post_id):
+    invalidate_stats(*Post.all_objects.filter(pk=post_id).values_list('user_id', flat=True))
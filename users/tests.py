@@ -1,3 +1,227 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from SnapBook import replicas
+from posts.models import Payment, Post
+from users.authentication import AUTH_FIELDS, cached_user, get_auth_fields, user_cache_key
+from users.authors import author_cache_key, get_author
+from users.hashing import PasswordCheckBusy
+from users.models import User
+from users.paginations import UserCursorPagination
+from users.stats import compute_stats
+
+
+class AuthorPageTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(email='author@example.com', password='pw', first_name='Ana')
+        Post.objects.create(user=self.author, caption='hello')
+        Payment.objects.create(
+            user=self.author, order_id='o1', transaction_id='t1', amount=10, status=Payment.VERIFIED
+        )
+        self.client = APIClient()
+
+    def test_card_shows_public_stats_only(self):
+        response = self.client.get(f'/api/users/{self.author.pk}/posts/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author']['first_name'], 'Ana')
+        self.assertEqual(response.data['author']['stats'], {
+            'posts_authored': 1, 'likes_received': 0, 'comments_received': 0,
+        })
+
+    def test_cache_holds_no_credentials(self):
+        get_author(self.author.pk)
+
+        cached = cache.get(author_cache_key(self.author.pk))
+        self.assertIn('password', cached.get_deferred_fields())
+        self.assertNotIn(self.author.password, repr(vars(cached)))
+
+    def test_saving_the_user_drops_the_cached_author(self):
+        get_author(self.author.pk)
+        self.author.is_active = False
+        self.author.save()
+
+        self.assertIsNone(get_author(self.author.pk))
+        self.assertEqual(self.client.get(f'/api/users/{self.author.pk}/posts/').status_code, 404)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='reader@example.com', password='pw', first_name='Rui')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(self.user)}')
+
+    def test_caches_only_authorization_fields(self):
+        response = self.client.get('/api/auth/users/me/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['first_name'], 'Rui')
+        self.assertEqual(set(cache.get(user_cache_key(self.user.pk))), set(AUTH_FIELDS))
+
+    def test_cached_user_loads_other_fields_at_once(self):
+        user = cached_user(get_auth_fields(self.user.pk))
+
+        with self.assertNumQueries(0):
+            self.assertEqual((user.email, user.is_staff), ('reader@example.com', False))
+        with self.assertNumQueries(1):
+            self.assertEqual((user.first_name, user.location, user.date_joined), (
+                'Rui', None, self.user.date_joined,
+            ))
+
+    def test_deactivated_user_is_refused_on_public_reads(self):
+        self.assertEqual(self.client.get('/api/posts/').status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get('/api/posts/').status_code, 401)
+        self.assertEqual(self.client.get('/api/auth/users/me/').status_code, 401)
+
+    def test_changes_through_request_user_drop_the_entry(self):
+        self.client.get('/api/auth/users/me/')
+        self.client.patch('/api/auth/users/me/', {'first_name': 'Rita'})
+
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.client.get('/api/auth/users/me/').data['first_name'], 'Rita')
+
+
+class AuthThrottleScopeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        rates = {**api_settings.DEFAULT_THROTTLE_RATES, 'auth': '1/min', 'user': '100/min'}
+        override = override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': rates})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_sign_up_uses_the_auth_rate(self):
+        first = self.client.post('/api/auth/users/', {'email': 'a@example.com', 'password': 'Long-enough-1'})
+        second = self.client.post('/api/auth/users/', {'email': 'b@example.com', 'password': 'Long-enough-1'})
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 429)
+
+    def test_profile_and_refresh_use_the_user_rate(self):
+        user = User.objects.create_user(email='reader@example.com', password='pw')
+        refresh = str(RefreshToken.for_user(user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {AccessToken.for_user(user)}')
+
+        for _ in range(3):
+            self.assertEqual(self.client.get('/api/auth/users/me/').status_code, 200)
+            self.assertEqual(self.client.post('/api/auth/jwt/refresh/', {'refresh': refresh}).status_code, 200)
+
+
+class LoginTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(email='reader@example.com', password='Long-enough-1')
+        self.client = APIClient()
+
+    def login(self, data, **kwargs):
+        return self.client.post('/api/auth/jwt/create/', data, **kwargs)
+
+    def test_login(self):
+        response = self.login({'email': 'reader@example.com', 'password': 'Long-enough-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+
+    def test_busy_password_pool_is_429(self):
+        with mock.patch('users.backends.pooled_check_password', side_effect=PasswordCheckBusy):
+            response = self.login({'email': 'reader@example.com', 'password': 'Long-enough-1'})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_wrong_password_is_401(self):
+        response = self.login({'email': 'reader@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_non_object_body_is_rejected(self):
+        response = self.login(['reader@example.com'], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ProfileStatsTests(TestCase):
+
+    def test_cached_data_is_read_from_the_primary(self):
+        user = User.objects.create_user(email='author@example.com', password='pw')
+        Post.objects.create(user=user, caption='hello')
+
+        # as inside a read_replica view; the alias does not exist, so any
+        # read routed to it would fail
+        token = replicas._read_alias.set('replica_missing')
+        self.addCleanup(replicas._read_alias.reset, token)
+
+        self.assertEqual(compute_stats(user.pk)['posts_authored'], 1)
+        self.assertEqual(get_author(user.pk), user)
+
+
+class AdminUserListTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='pw')
+        now = timezone.now()
+        self.users = {}
+        for n, (email, location, active) in enumerate([
+            ('ana@example.com', 'Dhaka', True),
+            ('bob@example.com', 'Sylhet', True),
+            ('cara@example.com', 'Dhaka', False),
+            ('dan@example.com', 'Dhaka', True),
+        ]):
+            user = User.objects.create_user(email=email, password='pw', location=location, is_active=active)
+            # ana and bob joined at the same moment
+            User.objects.filter(pk=user.pk).update(date_joined=now - timedelta(days=max(n, 1)))
+            self.users[email.split('@')[0]] = user.pk
+        User.objects.filter(pk=self.admin.pk).update(date_joined=now)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def ids(self, **params):
+        response = self.client.get('/api/admin/users/', params)
+        self.assertEqual(response.status_code, 200)
+        return [user['id'] for user in response.data['results']]
+
+    def test_admin_only(self):
+        self.client.force_authenticate(User.objects.get(pk=self.users['ana']))
+        self.assertEqual(self.client.get('/api/admin/users/').status_code, 403)
+
+    @mock.patch.object(UserCursorPagination, 'page_size', 2)
+    def test_cursor_pages_newest_first(self):
+        seen, response = [], self.client.get('/api/admin/users/')
+        while True:
+            seen += [user['id'] for user in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        users = self.users
+        self.assertEqual(seen, [self.admin.pk, max(users['ana'], users['bob']), min(users['ana'], users['bob']),
+                                users['cara'], users['dan']])
+
+    def test_filters(self):
+        users = self.users
+        self.assertEqual(self.ids(location='Dhaka'), [users['ana'], users['cara'], users['dan']])
+        self.assertEqual(self.ids(location='Dhaka', is_active='false'), [users['cara']])
+        before = timezone.now() - timedelta(days=2, hours=1)
+        self.assertEqual(
+            self.ids(joined_after=before.isoformat()),
+            [self.admin.pk, users['bob'], users['ana'], users['cara']]
+        )
+        self.assertEqual(self.ids(joined_before=before.isoformat()), [users['dan']])
+        self.assertEqual(self.ids(search='CAR'), [users['cara']])
 
-# Create your tests here.
@@ -0,0 +1,26 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class LoginIPThrottle(SimpleRateThrottle):
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request)
+        }
+
+
+class LoginAccountThrottle(SimpleRateThrottle):
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        # a JSON body may be a list or a scalar
+        email = request.data.get('email') if isinstance(request.data, dict) else None
+        if not email:
+            return None
+
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': str(email).strip().lower()
+        }
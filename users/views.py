@@ -3,10 +3,20 @@ from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, Throttled
 from drf_yasg.utils import swagger_auto_schema
 from users.models import User
 from rest_framework.permissions import IsAdminUser
 from users.serializers import UserProfileSerializer
+from users.throttles import LoginAccountThrottle, LoginIPThrottle
+from SnapBook.throttling import AuthThrottle
+from users.stats import get_stats
+from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework.filters import SearchFilter
+from django_filters.rest_framework import DjangoFilterBackend
+from users.filters import AdminUserFilter
+from users.paginations import UserCursorPagination
+from posts.deletion import schedule_user_deletion
 
 
 class AdminUserViewSet(ModelViewSet):
@@ -14,6 +24,10 @@ class AdminUserViewSet(ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserProfileSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = UserCursorPagination
+    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filterset_class = AdminUserFilter
+    search_fields = ['email', 'first_name', 'last_name']
 
     def destroy(self, request, *args, **kwargs):
 
@@ -25,11 +39,11 @@ class AdminUserViewSet(ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        user.delete()
+        job = schedule_user_deletion(user, requested_by=request.user)
 
         return Response(
-            {"message": "User deleted successfully"},
-            status=status.HTTP_200_OK
+            {"message": "User deletion started", "job_id": job.id},
+            status=status.HTTP_202_ACCEPTED
         )
 
 
@@ -41,19 +55,25 @@ class UserProfileView(ModelViewSet):
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
+    read_replica = True
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return User.objects.none()
         return User.objects.filter(id=self.request.user.id)
 
     @swagger_auto_schema(
         operation_summary="Get current user profile",
-        operation_description="Retrieve the profile information of the currently logged-in user.",
+        operation_description=(
+            "Retrieve the profile information of the currently logged-in user, "
+            "with `stats`: posts_authored, likes_received, comments_received and payments_made."
+        ),
         responses={200: UserProfileSerializer}
     )
     def list(self, request, *args, **kwargs):
 
         serializer = self.get_serializer(request.user)
-        return Response(serializer.data)
+        return Response({**serializer.data, "stats": get_stats(request.user.pk)})
 
     @swagger_auto_schema(
         operation_summary="Update user profile",
@@ -101,4 +121,21 @@ class UserProfileView(ModelViewSet):
         return Response(
             {"detail": "Method 'DELETE' not allowed."},
             status=status.HTTP_405_METHOD_NOT_ALLOWED
-        )
\ No newline at end of file
+        )
+
+
+
+
+class LoginView(TokenObtainPairView):
+    """JWT create with per-IP and per-account login throttling."""
+
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle, AuthThrottle]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            return super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            # PooledModelBackend refused because the hashing pool is full
+            if getattr(request, 'password_check_busy', False):
+                raise Throttled(wait=1, detail="Too many login attempts right now, try again shortly.")
+            raise